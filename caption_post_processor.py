@@ -5,40 +5,144 @@ Bundles captions into time windows and summarizes them using LLM
 """
 
 import cv2
+import numpy as np
+import asyncio
 import base64
+import bisect
 import json
+import multiprocessing
+import orjson
+import queue
+import sys
 import threading
 import time
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 import argparse
 import os
-from typing import List, Dict, Any
-import google.generativeai as genai
-from config import GEMINI_API_KEY, DEFAULT_CAMERA_INDEX, DEFAULT_FRAME_INTERVAL
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from itertools import groupby
+from operator import attrgetter
+from typing import List, Dict, Any, Tuple, Optional
+from cachetools import LFUCache
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+from google import genai as google_genai
+from google.genai import types as genai_types
+from frame_utils import (create_jpeg_encoder, encode_bgr_to_jpeg_bytes, dhash, hamming_distance,
+                         fourcc_name, request_mjpg)
+from gemini_models import configure, pick_model
+from config import (GEMINI_API_KEY, DEFAULT_CAMERA_INDEX, DEFAULT_FRAME_INTERVAL, BATCH_MODEL,
+                    MAX_CONCURRENT_GEMINI_REQUESTS, CAPTION_CACHE_SIZE, CAPTION_HASH_DISTANCE,
+                    ENCODE_WORKER_PROCESSES, ANALYSIS_QUEUE_SIZE, MOTION_THRESHOLD,
+                    SUMMARY_BATCH_SIZE, SUMMARY_BATCH_WAIT)
 
+CAPTION_PROMPT = "Describe what you see in this image in one concise sentence. Focus on the main objects, people, activities, and environment. Be brief but informative."
+ANALYSIS_SIZE = (640, 360)  # frames are downscaled to this before hashing/encoding
+FAILED_CAPTION_PREFIXES = ("Analysis error", "Gemini not initialized")  # never repeated onto other frames
+TEXT_SIZE_CACHE_LIMIT = 256  # overlay strings whose pixel size is remembered
+
+SUMMARY_RULES = """For each object or person in the scene, identify:
+1. Initial location/position
+2. Movement trajectory (where it moved to)
+3. Final location/position
+4. Whether it remained stationary
+
+Format the summary as:
+"Object started at [initial_location], moved to [final_location]. Object2 began at [initial_location], remained stationary. Object3 started at [initial_location], moved to [intermediate_location], then to [final_location]."
+
+Focus on:
+- Object identification (Person, laptop, cup, papers, phone, etc.)
+- Clear starting positions
+- Movement paths and destinations
+- Stationary objects that didn't move
+- Spatial relationships and positions
+
+Avoid:
+- Colors, lighting, or visual details
+- Emotional or subjective descriptions
+- Background elements unless they moved
+- Static environmental descriptions"""
+SUMMARY_PROMPT_SUFFIX = "\n\nReturn a JSON array with one string: the declarative summary of object movements.\n"
+
+_worker_tj = None
+
+def init_encode_worker():
+    """Process-pool initializer: one JPEG encoder per worker process"""
+    global _worker_tj
+    _worker_tj = create_jpeg_encoder()
+
+def encode_shared_frame(shm_name: str, shape: tuple) -> bytes:
+    """Process-pool task: JPEG-encode a frame that was copied into shared memory"""
+    shm = SharedMemory(name=shm_name)
+    try:
+        frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        jpeg_bytes = encode_bgr_to_jpeg_bytes(frame, 85, _worker_tj)
+        del frame
+        return jpeg_bytes
+    finally:
+        shm.close()
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def mean_abs_diff(a, b):
+        """Mean absolute pixel difference of two grayscale frames (JIT-compiled)"""
+        total = 0.0
+        for i in prange(a.shape[0]):
+            for j in range(a.shape[1]):
+                # Widen to a signed type first; uint8 - uint8 would wrap around
+                total += abs(np.int32(a[i, j]) - np.int32(b[i, j]))
+        return total / a.size
+else:
+    def mean_abs_diff(a, b):
+        """Mean absolute pixel difference of two grayscale frames"""
+        return float(cv2.absdiff(a, b).mean())
+
+@dataclass(slots=True)
 class CaptionEntry:
     """Represents a single caption with timestamp"""
-    def __init__(self, text: str, timestamp: float):
-        self.text = text.strip()
-        self.timestamp = timestamp
-        self.datetime = datetime.fromtimestamp(timestamp)
+    text: str
+    timestamp: float
+    
+    def __post_init__(self):
+        # Static scenes repeat the same caption; interning makes repeats share one string
+        text = self.text.strip()
+        self.text = sys.intern(text) if len(text) < 4096 else text
     
     def __str__(self):
-        return f"[{self.datetime.strftime('%H:%M:%S')}] {self.text}"
+        return f"[{datetime.fromtimestamp(self.timestamp):%H:%M:%S}] {self.text}"
+
+def format_caption_run(run: List[CaptionEntry]) -> str:
+    """Format consecutive identical captions as one line spanning their time range"""
+    if len(run) == 1:
+        return str(run[0])
+    start = datetime.fromtimestamp(run[0].timestamp)
+    end = datetime.fromtimestamp(run[-1].timestamp)
+    return f"[{start:%H:%M:%S} - {end:%H:%M:%S}] {run[0].text}"
 
+@dataclass(slots=True, eq=False)
 class CaptionWindow:
     """Represents a time window of captions"""
-    def __init__(self, start_time: float, window_duration: float):
-        self.start_time = start_time
-        self.end_time = start_time + window_duration
-        self.captions: List[CaptionEntry] = []
-        self.summary = ""
-        self.summarized = False
+    start_time: float
+    window_duration: float
+    end_time: float = field(init=False)
+    captions: List[CaptionEntry] = field(default_factory=list)
+    summary: str = ""
+    summarized: bool = False
+    pending: int = 0  # frames of this window still being analyzed
+    closed: bool = False  # past its end time; summarized once pending reaches zero
+    
+    def __post_init__(self):
+        self.end_time = self.start_time + self.window_duration
     
     def add_caption(self, caption: CaptionEntry):
-        """Add a caption to this window if it falls within the time range"""
+        """Add a caption to this window if it falls within the time range, keeping captions in time order"""
         if self.start_time <= caption.timestamp < self.end_time:
-            self.captions.append(caption)
+            bisect.insort(self.captions, caption, key=attrgetter("timestamp"))
             return True
         return False
     
@@ -47,8 +151,8 @@ class CaptionWindow:
         return current_time >= self.end_time
     
     def get_captions_text(self) -> str:
-        """Get all captions as a single text string"""
-        return "\n".join([str(caption) for caption in self.captions])
+        """Get all captions as a single text string, collapsing consecutive repeats"""
+        return "\n".join(format_caption_run(list(run)) for _, run in groupby(self.captions, key=attrgetter("text")))
     
     def get_timestamp_range(self) -> str:
         """Get human-readable timestamp range for this window"""
@@ -56,10 +160,129 @@ class CaptionWindow:
         end_dt = datetime.fromtimestamp(self.end_time)
         return f"{start_dt.strftime('%H:%M:%S')} - {end_dt.strftime('%H:%M:%S')}"
 
+class FrameBatcher:
+    """Accumulates JPEG frames for a window and captions them through the Gemini Batch API"""
+    POLL_INTERVAL = 5.0  # seconds between batch job status checks
+    TERMINAL_STATES = {
+        "JOB_STATE_SUCCEEDED",
+        "JOB_STATE_FAILED",
+        "JOB_STATE_CANCELLED",
+        "JOB_STATE_EXPIRED",
+    }
+    
+    def __init__(self, client, model_name: str, prompt: str = CAPTION_PROMPT):
+        self.client = client
+        self.model_name = model_name
+        self.prompt = prompt
+        self.frames: List[Tuple[float, bytes]] = []  # (capture timestamp, JPEG bytes)
+        self._lock = threading.Lock()
+        self._jobs: List[threading.Thread] = []
+    
+    def add_frame(self, jpeg_bytes: bytes, timestamp: float):
+        """Queue an encoded frame with its capture timestamp"""
+        with self._lock:
+            self.frames.append((timestamp, jpeg_bytes))
+    
+    def submit(self, window: CaptionWindow, on_complete):
+        """Submit the frames collected so far as one batch job for the given window.
+        
+        Upload, job creation and polling all run in a background thread so the
+        capture loop is never blocked; on_complete(window) is called once the
+        window's captions have been populated (or the job failed).
+        """
+        with self._lock:
+            # Frames captured after the window ended belong to the next window's batch
+            frames = [frame for frame in self.frames if frame[0] < window.end_time]
+            self.frames = [frame for frame in self.frames if frame[0] >= window.end_time]
+        
+        job_thread = threading.Thread(target=self._run_job, args=(frames, window, on_complete), daemon=True)
+        job_thread.start()
+        self._jobs.append(job_thread)
+    
+    def wait(self):
+        """Block until every submitted batch job has finished"""
+        pending = [job for job in self._jobs if job.is_alive()]
+        if pending:
+            print(f"Waiting for {len(pending)} batch job(s) to finish...")
+        for job in pending:
+            job.join()
+    
+    def _write_requests(self, frames: List[Tuple[float, bytes]]) -> str:
+        """Write frames as Batch API JSONL requests, returning the file path; keys carry the timestamps"""
+        fd, path = tempfile.mkstemp(prefix="caption_batch_", suffix=".jsonl")
+        with os.fdopen(fd, "w") as f:
+            for timestamp, jpeg_bytes in frames:
+                request = {
+                    "key": f"f{timestamp}",
+                    "request": {
+                        "contents": [{
+                            "parts": [
+                                {"inline_data": {"mime_type": "image/jpeg", "data": base64.b64encode(jpeg_bytes).decode("utf-8")}},
+                                {"text": self.prompt}
+                            ]
+                        }]
+                    }
+                }
+                f.write(json.dumps(request) + "\n")
+        return path
+    
+    def _run_job(self, frames: List[Tuple[float, bytes]], window: CaptionWindow, on_complete):
+        """Upload, create and poll a batch job, then fill the window with its captions"""
+        try:
+            if frames:
+                path = self._write_requests(frames)
+                try:
+                    uploaded = self.client.files.upload(
+                        file=path,
+                        config=genai_types.UploadFileConfig(display_name=os.path.basename(path), mime_type="jsonl")
+                    )
+                finally:
+                    os.remove(path)
+                
+                batch_job = self.client.batches.create(
+                    model=self.model_name,
+                    src=uploaded.name,
+                    config={"display_name": f"captions {window.get_timestamp_range()}"}
+                )
+                print(f"📦 Submitted batch {batch_job.name} with {len(frames)} frames [{window.get_timestamp_range()}]")
+                
+                while batch_job.state.name not in self.TERMINAL_STATES:
+                    time.sleep(self.POLL_INTERVAL)
+                    batch_job = self.client.batches.get(name=batch_job.name)
+                
+                if batch_job.state.name == "JOB_STATE_SUCCEEDED":
+                    result = self.client.files.download(file=batch_job.dest.file_name)
+                    self._parse_results(result.decode("utf-8"), window)
+                else:
+                    print(f"❌ Batch {batch_job.name} ended with {batch_job.state.name}: {batch_job.error}")
+        except Exception as e:
+            print(f"❌ Error running caption batch: {e}")
+        finally:
+            on_complete(window)
+    
+    def _parse_results(self, jsonl: str, window: CaptionWindow):
+        """Turn batch JSONL responses into CaptionEntry objects on the window"""
+        for line in jsonl.splitlines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            if "response" not in result:
+                print(f"❌ Frame {result.get('key')} failed: {result.get('error')}")
+                continue
+            
+            try:
+                text = result["response"]["candidates"][0]["content"]["parts"][0]["text"]
+            except (KeyError, IndexError):
+                continue
+            
+            timestamp = float(result["key"][1:])
+            window.add_caption(CaptionEntry(text, timestamp))
+
 class CaptionPostProcessor:
     """Post-processes captions from Gemini API with time-based bundling and summarization"""
     
-    def __init__(self, api_key: str, camera_index: int = 0, window_duration: float = 30.0):
+    def __init__(self, api_key: str, camera_index: int = 0, window_duration: float = 30.0,
+                 batch_mode: bool = False, headless: bool = False):
         """
         Initialize the caption post-processor
         
@@ -67,23 +290,83 @@ class CaptionPostProcessor:
             api_key (str): Google AI API key
             camera_index (int): Camera index (0 for default camera)
             window_duration (float): Duration of each caption window in seconds
+            batch_mode (bool): Caption frames through the Gemini Batch API once per window
+            headless (bool): Run without the preview window or overlay drawing
         """
         self.api_key = api_key
         self.camera_index = camera_index
         self.window_duration = window_duration
+        self.batch_mode = batch_mode
+        self.headless = headless
+        
+        # Static part of the summarization prompt, built once per processor
+        self._summary_prefix = (
+            f"\nAnalyze the following video captions from a {window_duration}-second window "
+            "and create a declarative summary focused on object movements.\n\n"
+            f"{SUMMARY_RULES}\n\nCaptions from "
+        )
         
         # Video capture
         self.cap = None
-        self.model = None
+        self._display_buf = None  # reused overlay canvas, allocated once per camera
+        self._text_size_cache: Dict[tuple, tuple] = {}
+        self.model_name = None
+        self.client = None
+        self.frame_batcher = None
         self.running = False
         
+        # Async frame analysis (loop runs in a background thread)
+        self.max_concurrency = MAX_CONCURRENT_GEMINI_REQUESTS
+        self._loop = None
+        self._loop_thread = None
+        self._frame_queue = None
+        self._semaphore = None
+        self._consumer = None
+        
+        # Run the analysis resize through OpenCL (T-API) when a device is available
+        self.use_opencl = cv2.ocl.haveOpenCL()
+        if self.use_opencl:
+            cv2.ocl.setUseOpenCL(True)
+        
+        # SIMD JPEG encoder (libjpeg-turbo); falls back to cv2.imencode if unavailable
+        self._tj = create_jpeg_encoder()
+        
+        # Encode worker processes, fed through shared-memory frame slots
+        self.encode_workers = ENCODE_WORKER_PROCESSES
+        self._encode_pool = None
+        self._encode_slots = None
+        self._shared_frames: List[SharedMemory] = []
+        
+        # Captions of recently seen frames, keyed by perceptual hash
+        self.caption_cache = LFUCache(maxsize=CAPTION_CACHE_SIZE)
+        
         # Caption management
         self.current_window = None
         self.completed_windows = []
+        self._window_starts: List[float] = []  # start times of completed_windows, for bisect
+        self._window_timer = None
+        self._window_lock = threading.Lock()
+        
+        # Completed windows waiting to be summarized, coalesced into batched calls
+        self._pending_summaries = queue.Queue()
+        self._summary_thread = None
         self.latest_description = "Initializing..."
         
+        # Unchanged frames repeat the caption of the reference frame they were compared against
+        self._reference_lock = threading.Lock()
+        self._reference_time = None  # capture time of the last frame sent for analysis
+        self._reference_caption = None  # its caption, once it arrived (None if it failed)
+        self._awaiting_reference: Dict[float, list] = {}  # reference time -> [(timestamp, window)] of unchanged frames
+        
+        # Overlay text is rebuilt only after the captions, windows or summaries change
+        self._display_text_cache = ""
+        self._display_dirty = True
+        
         # Frame management
         self.frame_count = 0
+        self.dropped_frames = 0
+        self.static_frames = 0
+        self._prev_gray = None  # grayscale copy of the last frame sent for analysis (the reference frame)
         self.last_frame_time = 0
         self.frame_interval = 0.5  # Send frame every 500ms
         
@@ -93,7 +376,12 @@ class CaptionPostProcessor:
     def initialize_gemini(self):
         """Initialize Gemini API with correct model names (same as gemini_success.py)"""
         print("Initializing Gemini API...")
-        genai.configure(api_key=self.api_key)
+        configure(self.api_key)
+        self.client = google_genai.Client(api_key=self.api_key)
+        
+        if self.batch_mode:
+            self.frame_batcher = FrameBatcher(self.client, BATCH_MODEL)
+            self.latest_description = "Batch mode: captions arrive after each window"
         
         # Use the correct model names from the available models list
         model_names = [
@@ -104,25 +392,11 @@ class CaptionPostProcessor:
             "gemini-pro-latest"
         ]
         
-        for model_name in model_names:
-            try:
-                print(f"Trying model: {model_name}")
-                self.model = genai.GenerativeModel(model_name)
-                
-                # Test the model with a simple request
-                test_response = self.model.generate_content("Hello")
-                if test_response.text:
-                    print(f"✅ Gemini API initialized successfully with {model_name}")
-                    return True
-                else:
-                    print(f"❌ Model {model_name} responded but no text")
-                    continue
-                    
-            except Exception as e:
-                print(f"❌ Failed to initialize {model_name}: {e}")
-                continue
-        
-        raise Exception("Could not initialize any Gemini model")
+        # One list_models() call replaces a test generate request per candidate
+        model_name = pick_model(model_names)
+        self.model_name = model_name
+        print(f"✅ Gemini API initialized successfully with {model_name}")
+        return True
     
     def initialize_camera(self):
         """Initialize the camera capture"""
@@ -132,6 +406,9 @@ class CaptionPostProcessor:
         if not self.cap.isOpened():
             raise Exception(f"Error: Could not open camera {self.camera_index}")
         
+        # Ask for MJPG so the camera compresses on-device instead of streaming raw YUV
+        request_mjpg(self.cap)
+        
         # Set camera properties
         self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
         self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
@@ -141,36 +418,81 @@ class CaptionPostProcessor:
         height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         fps = int(self.cap.get(cv2.CAP_PROP_FPS))
         
-        print(f"Camera initialized: {width}x{height} @ {fps}fps")
+        print(f"Camera initialized: {width}x{height} @ {fps}fps ({fourcc_name(self.cap)})")
+        self._display_buf = np.empty((height, width, 3), dtype=np.uint8)
         return width, height, fps
     
-    def analyze_frame(self, frame):
-        """Analyze a single frame using Gemini API (same as gemini_success.py)"""
-        if not self.model:
+    def resize_for_analysis(self, frame):
+        """Downscale a frame to ANALYSIS_SIZE, on the GPU via UMat when OpenCL is available"""
+        if self.use_opencl:
+            return cv2.resize(cv2.UMat(frame), ANALYSIS_SIZE, interpolation=cv2.INTER_AREA).get()
+        return cv2.resize(frame, ANALYSIS_SIZE, interpolation=cv2.INTER_AREA)
+    
+    def encode_frame(self, frame_resized) -> bytes:
+        """Encode an analysis-sized frame as JPEG bytes for Gemini"""
+        return encode_bgr_to_jpeg_bytes(frame_resized, 85, self._tj)
+    
+    async def encode_frame_async(self, frame_resized) -> bytes:
+        """Encode in a worker process via shared memory, or inline without a pool"""
+        if self._encode_pool is None:
+            return self.encode_frame(frame_resized)
+        
+        shm = await self._encode_slots.get()
+        try:
+            np.copyto(np.ndarray(frame_resized.shape, dtype=np.uint8, buffer=shm.buf), frame_resized)
+            return await asyncio.get_running_loop().run_in_executor(
+                self._encode_pool, encode_shared_frame, shm.name, frame_resized.shape
+            )
+        finally:
+            self._encode_slots.put_nowait(shm)
+    
+    def scene_changed(self, frame_resized) -> bool:
+        """Compare against the last analyzed frame; static scenes are not re-sent"""
+        gray = cv2.cvtColor(frame_resized, cv2.COLOR_BGR2GRAY)
+        if self._prev_gray is not None and mean_abs_diff(gray, self._prev_gray) <= MOTION_THRESHOLD:
+            self.static_frames += 1
+            return False
+        
+        self._prev_gray = gray
+        return True
+    
+    def lookup_caption(self, frame_hash: int) -> Optional[str]:
+        """Return the cached caption of this frame or a near-duplicate of it"""
+        description = self.caption_cache.get(frame_hash)
+        if description is not None:
+            return description
+        
+        for cached_hash in list(self.caption_cache.keys()):
+            if hamming_distance(frame_hash, cached_hash) <= CAPTION_HASH_DISTANCE:
+                return self.caption_cache[cached_hash]
+        return None
+    
+    async def analyze_frame(self, frame_resized):
+        """Analyze a single analysis-sized frame using the async Gemini client"""
+        if not self.model_name:
             return "Gemini not initialized"
         
         try:
-            # Resize frame for better performance
-            frame_resized = cv2.resize(frame, (640, 360))
-            
-            # Encode frame as JPEG
-            _, buffer = cv2.imencode('.jpg', frame_resized, [cv2.IMWRITE_JPEG_QUALITY, 85])
-            image_data = buffer.tobytes()
+            # Skip the API call when a near-identical frame was already captioned
+            frame_hash = dhash(frame_resized)
+            cached = self.lookup_caption(frame_hash)
+            if cached is not None:
+                return cached
             
             # Create image part for Gemini
-            image_part = {
-                "mime_type": "image/jpeg",
-                "data": image_data
-            }
-            
-            # Create prompt
-            prompt = "Describe what you see in this image in one concise sentence. Focus on the main objects, people, activities, and environment. Be brief but informative."
+            jpeg_bytes = await self.encode_frame_async(frame_resized)
+            image_part = genai_types.Part.from_bytes(data=jpeg_bytes, mime_type="image/jpeg")
             
             # Generate content
-            response = self.model.generate_content([prompt, image_part])
+            response = await self.client.aio.models.generate_content(
+                model=self.model_name,
+                contents=[CAPTION_PROMPT, image_part]
+            )
             
             if response.text:
-                return response.text.strip()
+                description = response.text.strip()
+                self.caption_cache[frame_hash] = description
+                return description
             else:
                 return "No description available"
                 
@@ -178,91 +500,391 @@ class CaptionPostProcessor:
             print(f"Error analyzing frame: {e}")
             return f"Analysis error: {str(e)}"
     
-    def complete_current_window(self):
-        """Complete the current window and generate summary"""
+    def ingest_caption(self, description: str, timestamp: float):
+        """Record a frame description as a caption in the current window"""
+        caption = CaptionEntry(description, timestamp)
+        self.latest_description = description
+        
+        # Initialize first window if needed
         if self.current_window is None:
+            self.start_window(timestamp)
+        
+        # Credit the window the frame was captured in, even if it closed meanwhile
+        window = self.find_window(timestamp)
+        if window is not None:
+            window.add_caption(caption)
+        self._display_dirty = True
+        
+        self.resolve_reference(timestamp, None if description.startswith(FAILED_CAPTION_PREFIXES) else caption.text)
+    
+    def set_reference(self, timestamp: float):
+        """Make a frame just sent for analysis the one unchanged frames are credited against"""
+        with self._reference_lock:
+            self._reference_time = timestamp
+            self._reference_caption = None
+            self._awaiting_reference[timestamp] = []
+    
+    def repeat_reference_caption(self, timestamp: float):
+        """Credit an unchanged frame with its reference frame's caption, waiting for it if still in flight"""
+        with self._reference_lock:
+            if self._reference_caption is not None:
+                text = self._reference_caption
+            elif self._reference_time in self._awaiting_reference:
+                # Hold the window's summary until the reference caption decides this frame
+                self._awaiting_reference[self._reference_time].append((timestamp, self.begin_analysis(timestamp)))
+                return
+            else:
+                return  # the reference failed or was dropped; nothing trustworthy to repeat
+        self.credit_unchanged(text, timestamp)
+    
+    def resolve_reference(self, reference_time: float, text: Optional[str]):
+        """A reference frame was captioned (text) or failed/dropped (None); settle the frames waiting on it"""
+        with self._reference_lock:
+            waiting = self._awaiting_reference.pop(reference_time, [])
+            if reference_time == self._reference_time:
+                self._reference_caption = text
+        
+        for timestamp, window in waiting:
+            if text is not None:
+                self.credit_unchanged(text, timestamp)
+            self.finish_analysis(window)
+    
+    def credit_unchanged(self, text: str, timestamp: float):
+        """Add a repeated caption for an unchanged frame, so a static scene still fills its window"""
+        window = self.find_window(timestamp)
+        if window is not None:
+            window.add_caption(CaptionEntry(text, timestamp))
+            self._display_dirty = True
+    
+    def find_window(self, timestamp: float) -> Optional[CaptionWindow]:
+        """Find the window covering a timestamp: the current one or a completed one"""
+        if self.current_window is not None and timestamp >= self.current_window.start_time:
+            return self.current_window
+        
+        i = bisect.bisect_right(self._window_starts, timestamp) - 1
+        if i < 0:
+            return None
+        return self.completed_windows[i]
+    
+    def begin_analysis(self, timestamp: float) -> Optional[CaptionWindow]:
+        """Count a frame headed for analysis against its window, holding back that window's summary"""
+        with self._window_lock:
+            window = self.find_window(timestamp)
+            if window is None or (window.closed and window.pending == 0):
+                return None  # its summary is already out
+            window.pending += 1
+            return window
+    
+    def finish_analysis(self, window: Optional[CaptionWindow]):
+        """A frame's analysis landed (or was dropped); summarize its window if it was the last one"""
+        if window is None:
             return
+        with self._window_lock:
+            window.pending -= 1
+            if window.closed and window.pending == 0:
+                self.summarize_closed_window(window)
+    
+    async def analyze_and_ingest(self, frame_resized, timestamp: float, window: Optional[CaptionWindow]):
+        """Analyze one frame, then release its concurrency slot"""
+        try:
+            description = await self.analyze_frame(frame_resized)
+        finally:
+            self._semaphore.release()
+        self.ingest_caption(description, timestamp)
+        self.finish_analysis(window)
+    
+    async def enqueue_frame(self, frame_resized, timestamp: float, window: Optional[CaptionWindow]):
+        """Queue a frame for analysis, dropping the oldest waiting frame when full"""
+        if self._frame_queue.full():
+            _, dropped_time, dropped_window = self._frame_queue.get_nowait()
+            self.dropped_frames += 1
+            if dropped_time == self._reference_time:
+                self._prev_gray = None  # compare the next frame against a fresh reference instead
+            self.resolve_reference(dropped_time, None)
+            self.finish_analysis(dropped_window)
+        self._frame_queue.put_nowait((frame_resized, timestamp, window))
+    
+    async def consume_frames(self):
+        """Pull frames off the queue and keep up to max_concurrency analyses in flight"""
+        in_flight = set()
+        while True:
+            item = await self._frame_queue.get()
+            if item is None:
+                break
+            
+            # Wait for a free slot so a stalled API backs up the queue instead of spawning tasks
+            await self._semaphore.acquire()
+            task = asyncio.create_task(self.analyze_and_ingest(*item))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
         
-        # Only summarize if there are captions
-        if self.current_window.captions:
-            self.summarize_window(self.current_window)
-        else:
-            self.current_window.summary = "No captions captured"
-            self.current_window.summarized = True
+        await asyncio.gather(*in_flight)
+    
+    def start_analysis_loop(self):
+        """Start the asyncio loop that analyzes frames in a background thread"""
+        self._loop = asyncio.new_event_loop()
+        self._frame_queue = asyncio.Queue(maxsize=ANALYSIS_QUEUE_SIZE)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        if self.encode_workers > 0:
+            # Two slots per worker so the next frame can be copied in while one encodes
+            width, height = ANALYSIS_SIZE
+            self._encode_slots = asyncio.Queue()
+            for _ in range(self.encode_workers * 2):
+                shm = SharedMemory(create=True, size=width * height * 3)
+                self._shared_frames.append(shm)
+                self._encode_slots.put_nowait(shm)
+            # Spawn rather than fork: by now the loop, summary and Numba threads are running in this process
+            self._encode_pool = ProcessPoolExecutor(max_workers=self.encode_workers, initializer=init_encode_worker,
+                                                    mp_context=multiprocessing.get_context("spawn"))
         
-        self.completed_windows.append(self.current_window)
+        self._loop_thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._loop_thread.start()
+        self._consumer = asyncio.run_coroutine_threadsafe(self.consume_frames(), self._loop)
     
-    def check_window_completion(self):
-        """Check if current window should be completed based on time"""
-        if self.current_window is None:
+    def stop_analysis_loop(self):
+        """Let in-flight analyses finish, then stop the background loop"""
+        if self._loop is None:
             return
         
-        current_time = time.time()
+        asyncio.run_coroutine_threadsafe(self._frame_queue.put(None), self._loop)
+        try:
+            self._consumer.result()
+        except Exception as e:
+            print(f"Error finishing frame analysis: {e}")
+        if self.dropped_frames:
+            print(f"Dropped {self.dropped_frames} stale frames while Gemini was busy")
+        
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+        self._loop.close()
+        self._loop = None
         
-        if self.current_window.is_complete(current_time):
-            self.complete_current_window()
+        if self._encode_pool is not None:
+            self._encode_pool.shutdown(wait=True)
+            self._encode_pool = None
+        for shm in self._shared_frames:
+            shm.close()
+            shm.unlink()
+        self._shared_frames = []
+    
+    def start_window(self, start_time: float):
+        """Open a caption window and schedule its completion for when it ends"""
+        with self._window_lock:
+            if self.current_window is not None and self.current_window.start_time >= start_time:
+                return
+            self.current_window = CaptionWindow(start_time, self.window_duration)
+            self._display_dirty = True
             
-            # Start new window
-            self.current_window = CaptionWindow(self.current_window.end_time, self.window_duration)
+            # No rollovers once capture has stopped; run() closes the last window itself
+            if not self.running:
+                return
+            self._window_timer = threading.Timer(
+                max(0.0, self.current_window.end_time - time.time()),
+                self.complete_current_window
+            )
+            self._window_timer.daemon = True
+            self._window_timer.start()
+    
+    def stop_window_timer(self):
+        """Cancel the pending window rollover and wait for one in progress"""
+        if self._window_timer is not None:
+            self._window_timer.cancel()
+        
+        # A completion that already fired holds the lock until it is done
+        with self._window_lock:
+            self._window_timer = None
+    
+    def complete_current_window(self, start_next: bool = True):
+        """Complete the current window, start the next one and generate the summary"""
+        with self._window_lock:
+            window = self.current_window
+            if window is None:
+                return
+            
+            self.completed_windows.append(window)
+            self._window_starts.append(window.start_time)
+            self._display_dirty = True
+        
+        # Roll over first so new captions keep flowing while this one is summarized
+        if start_next:
+            self.start_window(window.end_time)
+        
+        with self._window_lock:
+            if self.frame_batcher is not None:
+                # Captions arrive with the batch results; summarize once they land
+                self.frame_batcher.submit(window, self.finish_batch_window)
+                return
+            
+            # Frames captured near the end may still be in flight; the last one to land summarizes
+            window.closed = True
+            if window.pending == 0:
+                self.summarize_closed_window(window)
+    
+    def summarize_closed_window(self, window: CaptionWindow):
+        """Queue a finished live window for summarizing; caller holds _window_lock"""
+        # Only summarize if there are captions
+        if window.captions:
+            self.request_summary(window)
+        else:
+            window.summary = "No captions captured"
+            window.summarized = True
+            self._display_dirty = True
+    
+    def finish_batch_window(self, window: CaptionWindow):
+        """Summarize a window once its batch captions have been populated"""
+        if window.captions:
+            self.latest_description = window.captions[-1].text
+            self._display_dirty = True
+        self.request_summary(window)
+    
+    def request_summary(self, window: CaptionWindow):
+        """Queue a completed window for the summary worker"""
+        if not window.captions:
+            window.summary = "No captions to summarize"
+            window.summarized = True
+            self._display_dirty = True
+            return
+        self._pending_summaries.put(window)
+    
+    def start_summary_worker(self):
+        """Start the thread that summarizes completed windows"""
+        self._summary_thread = threading.Thread(target=self.summary_worker, daemon=True)
+        self._summary_thread.start()
+    
+    def stop_summary_worker(self):
+        """Summarize whatever is still queued, then stop the worker"""
+        if self._summary_thread is None:
+            return
+        self._pending_summaries.put(None)
+        self._summary_thread.join()
+        self._summary_thread = None
+    
+    def summary_worker(self):
+        """Coalesce windows that complete close together into one summary request"""
+        stopping = False
+        while not stopping:
+            window = self._pending_summaries.get()
+            if window is None:
+                break
+            
+            # Tumbling window: collect up to SUMMARY_BATCH_SIZE windows arriving within SUMMARY_BATCH_WAIT
+            windows = [window]
+            deadline = time.time() + SUMMARY_BATCH_WAIT
+            while len(windows) < SUMMARY_BATCH_SIZE:
+                try:
+                    window = self._pending_summaries.get(timeout=max(0.0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                if window is None:
+                    stopping = True
+                    break
+                windows.append(window)
+            
+            self.summarize_windows(windows)
+    
+    def summarize_windows(self, windows: List[CaptionWindow]):
+        """Summarize several windows with one structured request, one summary per window"""
+        if len(windows) == 1 or not self.model_name:
+            for window in windows:
+                self.summarize_window(window)
+            return
+        
+        try:
+            prompt = "".join([
+                f"\nAnalyze each of the following {len(windows)} groups of video captions. Each group comes from "
+                f"a separate {self.window_duration}-second window. Summarize each group separately with a "
+                "declarative summary focused on object movements.\n\n",
+                SUMMARY_RULES, "\n\n",
+                *(f"Group {i} - captions from {window.get_timestamp_range()}:\n{window.get_captions_text()}\n\n"
+                  for i, window in enumerate(windows, 1)),
+                f"Return a JSON array of exactly {len(windows)} strings: the declarative summary of object movements for each group, in order.\n"
+            ])
+            
+            summaries = self.generate_summaries(prompt, len(windows))
+        except Exception as e:
+            print(f"❌ Batched summary failed, summarizing windows one by one: {e}")
+            for window in windows:
+                self.summarize_window(window)
+            return
+        
+        for window, summary in zip(windows, summaries):
+            window.summary = summary
+            window.summarized = True
+            self._display_dirty = True
+            self.print_window_summary(window)
+    
+    def generate_summaries(self, prompt: str, count: int) -> List[str]:
+        """Request `count` summaries as a JSON array of strings"""
+        response = self.client.models.generate_content(
+            model=self.model_name,
+            contents=prompt,
+            config=genai_types.GenerateContentConfig(
+                response_mime_type="application/json",
+                response_schema={"type": "ARRAY", "items": {"type": "STRING"}}
+            )
+        )
+        summaries = orjson.loads(response.text)
+        if not isinstance(summaries, list) or len(summaries) != count:
+            raise ValueError(f"expected {count} summaries, got {summaries!r}")
+        return [str(summary).strip() for summary in summaries]
+    
+    def print_window_summary(self, window: CaptionWindow):
+        """Print a freshly generated window summary"""
+        print(f"\n📊 WINDOW SUMMARY [{window.get_timestamp_range()}]:")
+        print(f"{window.summary}")
+        print(f"({len(window.captions)} captions processed)")
+        print("-" * 80)
     
     def summarize_window(self, window: CaptionWindow):
         """Summarize a completed caption window using LLM"""
-        if not self.model or not window.captions:
+        if not self.model_name or not window.captions:
             window.summary = "No captions to summarize"
             window.summarized = True
+            self._display_dirty = True
             return
         
         try:
-            # Prepare the prompt for summarization
+            # Prepare the prompt for summarization; only the range and captions vary
             captions_text = window.get_captions_text()
-            prompt = f"""
-Analyze the following video captions from a {self.window_duration}-second window and create a declarative summary focused on object movements.
-
-For each object or person in the scene, identify:
-1. Initial location/position
-2. Movement trajectory (where it moved to)
-3. Final location/position
-4. Whether it remained stationary
-
-Format the summary as:
-"Object started at [initial_location], moved to [final_location]. Object2 began at [initial_location], remained stationary. Object3 started at [initial_location], moved to [intermediate_location], then to [final_location]."
-
-Focus on:
-- Object identification (Person, laptop, cup, papers, phone, etc.)
-- Clear starting positions
-- Movement paths and destinations
-- Stationary objects that didn't move
-- Spatial relationships and positions
-
-Avoid:
-- Colors, lighting, or visual details
-- Emotional or subjective descriptions
-- Background elements unless they moved
-- Static environmental descriptions
-
-Captions from {window.get_timestamp_range()}:
-{captions_text}
-
-Provide a declarative summary of object movements:
-"""
+            prompt = "".join([
+                self._summary_prefix,
+                window.get_timestamp_range(), ":\n",
+                captions_text,
+                SUMMARY_PROMPT_SUFFIX
+            ])
             
-            # Generate summary
-            response = self.model.generate_content(prompt)
-            window.summary = response.text.strip()
+            # Same client and schema as the batched path, with a one-element array
+            window.summary = self.generate_summaries(prompt, 1)[0]
             window.summarized = True
-            
-            print(f"\n📊 WINDOW SUMMARY [{window.get_timestamp_range()}]:")
-            print(f"{window.summary}")
-            print(f"({len(window.captions)} captions processed)")
-            print("-" * 80)
+            self._display_dirty = True
+            self.print_window_summary(window)
             
         except Exception as e:
             print(f"❌ Error summarizing window: {e}")
             window.summary = f"Summary error: {str(e)}"
             window.summarized = True
+            self._display_dirty = True
+    
+    def measure_text(self, line: str, scale: float = 0.6, thickness: int = 2) -> tuple:
+        """cv2.getTextSize memoized per string; overlay lines rarely change between frames"""
+        key = (line, scale, thickness)
+        size = self._text_size_cache.get(key)
+        if size is None:
+            if len(self._text_size_cache) >= TEXT_SIZE_CACHE_LIMIT:
+                # FIFO eviction: drop the oldest measured string
+                del self._text_size_cache[next(iter(self._text_size_cache))]
+            size = cv2.getTextSize(line, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)[0]
+            self._text_size_cache[key] = size
+        return size
     
     def get_display_text(self) -> str:
-        """Get text to display on the video frame"""
+        """Get text to display on the video frame, rebuilt only when its inputs changed"""
+        if not self._display_dirty:
+            return self._display_text_cache
+        # Clear first so a change landing mid-rebuild triggers another one
+        self._display_dirty = False
+        
         lines = []
         
         # Current caption
@@ -279,7 +901,8 @@ Provide a declarative summary of object movements:
             if latest_summary.summarized:
                 lines.append(f"Latest Summary: {latest_summary.summary}")
         
-        return "\n".join(lines)
+        self._display_text_cache = "\n".join(lines)
+        return self._display_text_cache
     
     def capture_and_display(self):
         """Main video capture and display loop"""
@@ -287,7 +910,7 @@ Provide a declarative summary of object movements:
             width, height, fps = self.initialize_camera()
             
             print(f"\nStarting video capture with {self.window_duration}s caption windows...")
-            print("Press 'q' to quit")
+            print("Press Ctrl+C to stop" if self.headless else "Press 'q' to quit")
             
             while self.running:
                 ret, frame = self.cap.read()
@@ -295,35 +918,44 @@ Provide a declarative summary of object movements:
                     print("Error: Could not read frame from camera")
                     break
                 
-                # Analyze frame if enough time has passed
+                # Analyze frame if enough time has passed and the scene changed
                 current_time = time.time()
                 if current_time - self.last_frame_time >= self.frame_interval:
-                    # Run analysis in a separate thread to avoid blocking
-                    def analyze():
-                        description = self.analyze_frame(frame)
-                        timestamp = time.time()
-                        
-                        # Create caption entry and add directly to current window
-                        caption = CaptionEntry(description, timestamp)
-                        self.latest_description = description
-                        
-                        # Initialize first window if needed
-                        if self.current_window is None:
-                            self.current_window = CaptionWindow(timestamp, self.window_duration)
-                        
-                        # Add caption to current window
-                        self.current_window.add_caption(caption)
-                    
-                    analysis_thread = threading.Thread(target=analyze)
-                    analysis_thread.start()
                     self.last_frame_time = current_time
-                    self.frame_count += 1
+                    frame_resized = self.resize_for_analysis(frame)
+                    
+                    # Open the first window from here so frames analyzed before any reply still have one
+                    if self.current_window is None:
+                        self.start_window(current_time)
+                    
+                    changed = self.scene_changed(frame_resized)
+                    if self.frame_batcher is not None:
+                        # Batch mode: just collect the frame, the window submits it later; a static
+                        # window still sends its first frame so the summary has something to go on
+                        if changed or not self.frame_batcher.frames:
+                            self.frame_batcher.add_frame(self.encode_frame(frame_resized), current_time)
+                            self.frame_count += 1
+                    elif changed:
+                        # Hand the frame to the analysis loop without blocking capture
+                        window = self.begin_analysis(current_time)
+                        self.set_reference(current_time)
+                        asyncio.run_coroutine_threadsafe(
+                            self.enqueue_frame(frame_resized, current_time, window), self._loop
+                        )
+                        self.frame_count += 1
+                    else:
+                        # Nothing moved: the scene still looks like the reference frame's caption says
+                        self.repeat_reference_caption(current_time)
                 
-                # Check if current window should be completed (every frame)
-                self.check_window_completion()
+                if self.headless:
+                    # No GUI; read() already paces the loop at the camera rate
+                    continue
                 
-                # Display frame with information overlay
-                display_frame = frame.copy()
+                # Draw on the reusable canvas; the queued frame for analysis stays untouched
+                if self._display_buf.shape != frame.shape:
+                    self._display_buf = np.empty_like(frame)
+                np.copyto(self._display_buf, frame)
+                display_frame = self._display_buf
                 
                 # Add text overlay with background
                 display_text = self.get_display_text()
@@ -333,7 +965,7 @@ Provide a declarative summary of object movements:
                 for i, line in enumerate(description_lines[:8]):  # Show first 8 lines
                     if line.strip():
                         # Add background rectangle for better text visibility
-                        text_size = cv2.getTextSize(line.strip(), cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)[0]
+                        text_size = self.measure_text(line.strip())
                         cv2.rectangle(display_frame, (5, y_offset - 20), (text_size[0] + 10, y_offset + 5), (0, 0, 0), -1)
                         cv2.putText(display_frame, line.strip(), (10, y_offset), 
                                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
@@ -351,6 +983,8 @@ Provide a declarative summary of object movements:
                 if key == ord('q') or key == 27:  # 'q' or ESC
                     break
                     
+        except KeyboardInterrupt:
+            print("\nStopping capture...")
         except Exception as e:
             print(f"Error in video capture: {e}")
         finally:
@@ -361,7 +995,8 @@ Provide a declarative summary of object movements:
         self.running = False
         if self.cap:
             self.cap.release()
-        cv2.destroyAllWindows()
+        if not self.headless:
+            cv2.destroyAllWindows()
         print("Cleanup completed")
     
     def print_summary_report(self):
@@ -386,15 +1021,24 @@ Provide a declarative summary of object movements:
     def run(self):
         """Main run method"""
         self.running = True
-        self.capture_and_display()
+        self.start_summary_worker()
+        if self.frame_batcher is None:
+            self.start_analysis_loop()
         
-        # Process any remaining captions
-        self.process_captions()
+        self.capture_and_display()
+        self.stop_analysis_loop()
+        if self.static_frames:
+            print(f"Skipped {self.static_frames} frames with no scene change")
+        self.stop_window_timer()
         
-        # Summarize current window if it has content
-        if self.current_window and self.current_window.captions:
-            self.summarize_window(self.current_window)
-            self.completed_windows.append(self.current_window)
+        # Submit the frames of the last window and wait for their captions
+        if self.frame_batcher is not None:
+            self.complete_current_window(start_next=False)
+            self.frame_batcher.wait()
+        # Summarize current window if it has content; closing it keeps _window_starts in step
+        elif self.current_window and self.current_window.captions:
+            self.complete_current_window(start_next=False)
+        self.stop_summary_worker()
         
         # Print final report
         self.print_summary_report()
@@ -406,6 +1050,10 @@ def main():
     parser.add_argument('--window-duration', type=float, default=30.0, 
                        help='Duration of each caption window in seconds (default: 30)')
     parser.add_argument('--interval', type=float, help='Frame send interval in seconds (overrides .env file)')
+    parser.add_argument('--batch', action='store_true',
+                       help='Caption frames via the Gemini Batch API once per window (half cost, delayed captions)')
+    parser.add_argument('--headless', action='store_true',
+                       help='Run without the preview window (stop with Ctrl+C)')
     
     args = parser.parse_args()
     
@@ -423,7 +1071,8 @@ def main():
         return
     
     # Create post-processor instance
-    processor = CaptionPostProcessor(api_key, camera_index, window_duration)
+    processor = CaptionPostProcessor(api_key, camera_index, window_duration,
+                                     batch_mode=args.batch, headless=args.headless)
     processor.frame_interval = frame_interval
     
     print("Caption Post-Processor for Gemini Live API")
@@ -431,6 +1080,7 @@ def main():
     print(f"Camera: {camera_index}")
     print(f"Window duration: {window_duration}s")
     print(f"Frame interval: {frame_interval}s")
+    print(f"Caption mode: {'batch' if args.batch else 'live'}")
     print("=" * 60)
     
     # Run the post-processor
@@ -11,16 +11,26 @@ load_dotenv()
 # Google AI API Configuration
 # Get your API key from: https://aistudio.google.com/app/apikey
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "YOUR_API_KEY_HERE")
+BATCH_MODEL = os.getenv("BATCH_MODEL", "gemini-2.5-flash")  # model used for Batch API captioning
 
 # Camera Configuration
 DEFAULT_CAMERA_INDEX = int(os.getenv("DEFAULT_CAMERA_INDEX", "0"))
 DEFAULT_FRAME_INTERVAL = float(os.getenv("DEFAULT_FRAME_INTERVAL", "0.5"))  # seconds between frames sent to Gemini
+MAX_CONCURRENT_GEMINI_REQUESTS = int(os.getenv("MAX_CONCURRENT_GEMINI_REQUESTS", "8"))  # in-flight frame analyses
+CAPTION_CACHE_SIZE = int(os.getenv("CAPTION_CACHE_SIZE", "512"))  # cached captions keyed by frame hash
+CAPTION_HASH_DISTANCE = int(os.getenv("CAPTION_HASH_DISTANCE", "4"))  # max differing hash bits for a cache hit
+ENCODE_WORKER_PROCESSES = int(os.getenv("ENCODE_WORKER_PROCESSES", "2"))  # JPEG encode processes, 0 = encode inline
+ANALYSIS_QUEUE_SIZE = int(os.getenv("ANALYSIS_QUEUE_SIZE", "8"))  # frames waiting for analysis before the oldest is dropped
+MOTION_THRESHOLD = float(os.getenv("MOTION_THRESHOLD", "2.0"))  # mean pixel change below which a frame is skipped
+SUMMARY_BATCH_SIZE = int(os.getenv("SUMMARY_BATCH_SIZE", "4"))  # max windows summarized in one request
+SUMMARY_BATCH_WAIT = float(os.getenv("SUMMARY_BATCH_WAIT", "2.0"))  # seconds to wait for more windows to batch
 
 # Video Configuration
 DEFAULT_WIDTH = int(os.getenv("DEFAULT_WIDTH", "1280"))
 DEFAULT_HEIGHT = int(os.getenv("DEFAULT_HEIGHT", "720"))
 DEFAULT_FPS = int(os.getenv("DEFAULT_FPS", "30"))
 JPEG_QUALITY = int(os.getenv("JPEG_QUALITY", "85"))
+LIVE_JPEG_QUALITY = int(os.getenv("LIVE_JPEG_QUALITY", "70"))  # quality of frames streamed over the Live WebSocket
 
 # Display Configuration
 MAX_DESCRIPTION_LINES = 5
@@ -0,0 +1,80 @@
+"""
+Frame helpers shared by the Gemini video scripts
+"""
+
+import cv2
+import numpy as np
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+except ImportError:
+    TurboJPEG = None
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+def create_jpeg_encoder():
+    """SIMD JPEG encoder (libjpeg-turbo), or None to fall back to cv2.imencode"""
+    if TurboJPEG is None:
+        return None
+    try:
+        return TurboJPEG()
+    except (OSError, RuntimeError) as e:
+        print(f"libjpeg-turbo unavailable, using OpenCV JPEG encoder: {e}")
+        return None
+
+def encode_bgr_to_jpeg_bytes(img, quality=85, tj=None) -> bytes:
+    """Encode a BGR frame as 4:2:0 JPEG bytes with libjpeg-turbo if given, else OpenCV"""
+    img = np.ascontiguousarray(img)  # no-op for frames straight from cv2.resize
+    if tj is not None:
+        return tj.encode(img, quality=quality, pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420)
+    
+    _, buffer = cv2.imencode('.jpg', img, [
+        cv2.IMWRITE_JPEG_QUALITY, quality,
+        cv2.IMWRITE_JPEG_SAMPLING_FACTOR, cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420
+    ])
+    return buffer.tobytes()
+
+def dhash_thumbnail(frame):
+    """9x8 grayscale thumbnail that the difference hash is computed from"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+
+if njit is not None:
+    @njit(cache=True)
+    def dhash64(thumb):
+        """Pack the 64 left-to-right brightness gradients of a 9x8 thumbnail (JIT-compiled)"""
+        h = np.uint64(0)
+        for r in range(8):
+            for c in range(8):
+                h = (h << np.uint64(1)) | np.uint64(thumb[r, c + 1] > thumb[r, c])
+        return h
+    
+    def dhash(frame) -> int:
+        """64-bit difference hash: brightness gradients of a 9x8 grayscale thumbnail"""
+        return int(dhash64(dhash_thumbnail(frame)))
+else:
+    def dhash(frame) -> int:
+        """64-bit difference hash: brightness gradients of a 9x8 grayscale thumbnail"""
+        thumb = dhash_thumbnail(frame)
+        bits = thumb[:, 1:] > thumb[:, :-1]
+        return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two frame hashes"""
+    return (a ^ b).bit_count()
+
+def fourcc_name(cap) -> str:
+    """Pixel format a VideoCapture is delivering, e.g. 'MJPG' or 'YUYV'"""
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    return "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)) if fourcc else "default"
+
+def request_mjpg(cap) -> str:
+    """Ask the camera for MJPG, falling back to YUYV if it refuses; returns the format in use"""
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+    if fourcc_name(cap) == 'MJPG':
+        return 'MJPG'
+    
+    print(f"Camera refused MJPG (got {fourcc_name(cap)}), falling back to YUYV")
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'YUYV'))
+    return fourcc_name(cap)
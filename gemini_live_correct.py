@@ -6,7 +6,7 @@ Uses the actual Gemini Live API WebSocket for real-time video processing.
 
 import cv2
 import base64
-import json
+import orjson
 import asyncio
 import websockets
 import threading
@@ -16,6 +16,10 @@ import argparse
 import os
 from config import GEMINI_API_KEY, DEFAULT_CAMERA_INDEX, DEFAULT_FRAME_INTERVAL
 
+# realtimeInput envelope around the base64 JPEG; the base64 alphabet needs no JSON escaping
+FRAME_MESSAGE_HEAD = b'{"realtimeInput":{"mediaChunks":[{"mimeType":"image/jpeg","data":"'
+FRAME_MESSAGE_TAIL = b'"}]}}'
+
 class GeminiLiveCorrect:
     def __init__(self, api_key, camera_index=0):
         """
@@ -62,7 +66,11 @@ class GeminiLiveCorrect:
         
         try:
             print("Connecting to Gemini Live API...")
-            self.websocket = await websockets.connect(uri)
+            # JPEG payloads don't compress, so skip permessage-deflate; bound the buffers
+            # so a slow side shows up as backpressure instead of memory growth
+            self.websocket = await websockets.connect(
+                uri, compression=None, max_size=2**24, max_queue=4, write_limit=2**20
+            )
             
             # Send setup message
             setup_message = {
@@ -80,7 +88,7 @@ class GeminiLiveCorrect:
                 }
             }
             
-            await self.websocket.send(json.dumps(setup_message))
+            await self.websocket.send(orjson.dumps(setup_message).decode())
             print("Connected to Gemini Live API successfully!")
             return True
             
@@ -99,19 +107,11 @@ class GeminiLiveCorrect:
             
             # Encode frame as JPEG
             _, buffer = cv2.imencode('.jpg', frame_resized, [cv2.IMWRITE_JPEG_QUALITY, 80])
-            frame_base64 = base64.b64encode(buffer).decode('utf-8')
             
-            # Create message for Gemini Live API
-            message = {
-                "realtimeInput": {
-                    "mediaChunks": [{
-                        "mimeType": "image/jpeg",
-                        "data": frame_base64
-                    }]
-                }
-            }
+            # Splice the base64 bytes straight into the message: no str decode, no JSON pass
+            message = b"".join((FRAME_MESSAGE_HEAD, base64.b64encode(buffer), FRAME_MESSAGE_TAIL))
             
-            await self.websocket.send(json.dumps(message))
+            await self.websocket.send(message)
             self.frame_count += 1
             
         except Exception as e:
@@ -122,7 +122,7 @@ class GeminiLiveCorrect:
         try:
             while self.running and self.websocket:
                 response = await self.websocket.recv()
-                response_data = json.loads(response)
+                response_data = orjson.loads(response)
                 
                 # Extract text description
                 if "serverContent" in response_data:
@@ -5,16 +5,30 @@ Uses the official Google library for real-time video processing.
 """
 
 import cv2
+import numpy as np
 import base64
-import json
 import asyncio
+import concurrent.futures
+import queue
 import threading
 import time
+from collections import OrderedDict
 from datetime import datetime
 import argparse
 import os
-import google.generativeai as genai
-from config import GEMINI_API_KEY, DEFAULT_CAMERA_INDEX, DEFAULT_FRAME_INTERVAL
+import httpx
+import orjson
+from frame_utils import (create_jpeg_encoder, encode_bgr_to_jpeg_bytes, dhash, hamming_distance,
+                         fourcc_name, request_mjpg)
+from gemini_models import configure, pick_model, forget_cached_model
+from config import GEMINI_API_KEY, DEFAULT_CAMERA_INDEX, DEFAULT_FRAME_INTERVAL, CAPTION_HASH_DISTANCE
+
+CAPTION_PROMPT = "Describe what you see in this image in one concise sentence. Focus on the main objects, people, activities, and environment. Be brief but informative."
+ANALYSIS_SIZE = (640, 360)  # frames are downscaled once to this for analysis and preview
+DISPLAY_INTERVAL = 1 / 30  # preview refresh period on the GUI (main) thread
+RESPONSE_CACHE_SIZE = 128  # descriptions remembered by frame hash
+GENERATE_URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+MAX_IN_FLIGHT_REQUESTS = 4  # overlapping generateContent calls; more frames are dropped
 
 class GeminiLiveOfficial:
     def __init__(self, api_key, camera_index=0):
@@ -28,12 +42,31 @@ class GeminiLiveOfficial:
         self.api_key = api_key
         self.camera_index = camera_index
         self.cap = None
-        self.model = None
+        self.model_name = None
         self.running = False
         self.latest_description = "Initializing..."
         self.frame_count = 0
         self.last_frame_time = 0
         self.frame_interval = 0.5  # Send frame every 500ms
+        self.last_preview_time = 0
+        self.preview_interval = 1 / 15  # Decode frames for the preview at ~15fps
+        self._tj = create_jpeg_encoder()  # reused for every frame
+        self._capture_buf = None  # full-size frame that every retrieve() decodes into
+        self._overlay_cache = (None, None, None)  # (text, sprite, mask) of the rendered description
+        self._display_q = queue.Queue(maxsize=1)  # newest preview frame for the GUI thread
+        
+        # Requests run on an asyncio loop in a background thread over one pooled HTTP/2 client
+        self._loop = None
+        self._loop_thread = None
+        self._http = None
+        self._request_slots = threading.BoundedSemaphore(MAX_IN_FLIGHT_REQUESTS)
+        self._requests = set()  # futures of in-flight analyses
+        self._seq = 0  # sequence number of the last submitted frame
+        self._latest_seq = 0  # sequence number of the frame latest_description belongs to
+        self.dropped_frames = 0
+        
+        # LRU of frame hash -> description; near-duplicate frames skip the API call
+        self._cache = OrderedDict()
         
     def initialize_camera(self):
         """Initialize the camera capture"""
@@ -43,7 +76,8 @@ class GeminiLiveOfficial:
         if not self.cap.isOpened():
             raise Exception(f"Error: Could not open camera {self.camera_index}")
         
-        # Set camera properties
+        # Set camera properties; MJPG lets grab() skip frames without decoding them
+        request_mjpg(self.cap)
         self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
         self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
         self.cap.set(cv2.CAP_PROP_FPS, 30)
@@ -52,13 +86,14 @@ class GeminiLiveOfficial:
         height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         fps = int(self.cap.get(cv2.CAP_PROP_FPS))
         
-        print(f"Camera initialized: {width}x{height} @ {fps}fps")
+        print(f"Camera initialized: {width}x{height} @ {fps}fps ({fourcc_name(self.cap)})")
+        self._capture_buf = np.empty((height, width, 3), dtype=np.uint8)
         return width, height, fps
     
     def initialize_gemini(self):
         """Initialize Gemini API"""
         print("Initializing Gemini API...")
-        genai.configure(api_key=self.api_key)
+        configure(self.api_key)
         
         # Try different model names
         model_names = [
@@ -69,44 +104,66 @@ class GeminiLiveOfficial:
             "models/gemini-1.5-pro"
         ]
         
-        for model_name in model_names:
-            try:
-                self.model = genai.GenerativeModel(model_name)
-                print(f"Gemini API initialized successfully with model: {model_name}")
-                return True
-            except Exception as e:
-                print(f"Failed to initialize with {model_name}: {e}")
-                continue
-        
-        raise Exception("Could not initialize any Gemini model")
-    
-    def analyze_frame(self, frame):
-        """Analyze a single frame using Gemini API"""
-        if not self.model:
+        # One list_models() call instead of constructing each candidate in turn
+        self.model_name = pick_model(model_names)
+        print(f"Gemini API initialized successfully with model: {self.model_name}")
+        return True
+    
+    def lookup_description(self, frame_hash):
+        """Return the cached description of this frame or a near-duplicate of it"""
+        for cached_hash in reversed(self._cache):
+            if hamming_distance(frame_hash, cached_hash) <= CAPTION_HASH_DISTANCE:
+                self._cache.move_to_end(cached_hash)
+                return self._cache[cached_hash]
+        return None
+    
+    def cache_description(self, frame_hash, description):
+        """Remember a description, evicting the least recently used one when full"""
+        self._cache[frame_hash] = description
+        self._cache.move_to_end(frame_hash)
+        if len(self._cache) > RESPONSE_CACHE_SIZE:
+            self._cache.popitem(last=False)
+    
+    async def analyze_frame(self, frame_resized):
+        """Analyze a single downscaled frame with one async generateContent request"""
+        if not self.model_name:
             return "Gemini not initialized"
         
         try:
-            # Resize frame for better performance
-            frame_resized = cv2.resize(frame, (640, 360))
-            
-            # Encode frame as JPEG
-            _, buffer = cv2.imencode('.jpg', frame_resized, [cv2.IMWRITE_JPEG_QUALITY, 85])
-            image_data = buffer.tobytes()
-            
-            # Create image part for Gemini
-            image_part = {
-                "mime_type": "image/jpeg",
-                "data": image_data
-            }
+            # Skip the API call when a near-identical frame was already described
+            frame_hash = dhash(frame_resized)
+            cached = self.lookup_description(frame_hash)
+            if cached is not None:
+                return cached
             
-            # Create prompt
-            prompt = "Describe what you see in this image in one concise sentence. Focus on the main objects, people, activities, and environment. Be brief but informative."
+            # Encode frame as JPEG and splice it into the request body
+            image_data = encode_bgr_to_jpeg_bytes(frame_resized, 85, self._tj)
+            body = orjson.dumps({
+                "contents": [{
+                    "parts": [
+                        {"text": CAPTION_PROMPT},
+                        {"inline_data": {"mime_type": "image/jpeg",
+                                         "data": base64.b64encode(image_data).decode('ascii')}}
+                    ]
+                }]
+            })
             
             # Generate content
-            response = self.model.generate_content([prompt, image_part])
+            response = await self._http.post(
+                GENERATE_URL.format(model=self.model_name),
+                content=body,
+                headers={"Content-Type": "application/json", "x-goog-api-key": self.api_key}
+            )
+            if response.status_code == 404:
+                # The picked model went away; choose again on the next start
+                forget_cached_model()
+            response.raise_for_status()
             
-            if response.text:
-                return response.text.strip()
+            parts = orjson.loads(response.content)["candidates"][0]["content"].get("parts", [])
+            text = "".join(part.get("text", "") for part in parts).strip()
+            if text:
+                self.cache_description(frame_hash, text)
+                return text
             else:
                 return "No description available"
                 
@@ -114,80 +171,197 @@ class GeminiLiveOfficial:
             print(f"Error analyzing frame: {e}")
             return f"Analysis error: {str(e)}"
     
+    async def analyze_and_publish(self, frame_resized, seq):
+        """Analyze a frame and show the result unless a newer frame was answered first"""
+        try:
+            description = await self.analyze_frame(frame_resized)
+        finally:
+            self._request_slots.release()
+        
+        if seq > self._latest_seq:
+            self._latest_seq = seq
+            self.latest_description = description
+            print(f"Gemini: {description}")
+    
+    def submit_frame(self, frame_resized):
+        """Start analyzing a frame on the request loop; dropped if all request slots are busy"""
+        if not self._request_slots.acquire(blocking=False):
+            self.dropped_frames += 1
+            return False
+        
+        self._seq += 1
+        future = asyncio.run_coroutine_threadsafe(
+            self.analyze_and_publish(frame_resized, self._seq), self._loop
+        )
+        self._requests.add(future)
+        future.add_done_callback(self._requests.discard)
+        return True
+    
+    def start_analysis_loop(self):
+        """Start the asyncio loop that runs the Gemini requests in a background thread"""
+        self._loop = asyncio.new_event_loop()
+        self._http = httpx.AsyncClient(http2=True, timeout=30.0,
+                                       limits=httpx.Limits(max_connections=MAX_IN_FLIGHT_REQUESTS))
+        self._loop_thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._loop_thread.start()
+    
+    def stop_analysis_loop(self):
+        """Give in-flight requests a moment to finish, then stop the background loop"""
+        if self._loop is None:
+            return
+        
+        concurrent.futures.wait(list(self._requests), timeout=5.0)
+        for future in list(self._requests):
+            future.cancel()
+        if self.dropped_frames:
+            print(f"Dropped {self.dropped_frames} frames while all Gemini requests were busy")
+        
+        asyncio.run_coroutine_threadsafe(self._http.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+        self._loop.close()
+        self._loop = None
+    
+    def render_overlay(self, text, width):
+        """Pre-render the description lines on their black backgrounds into a sprite and mask"""
+        lines = [line.strip() for line in text.split('\n')[:5] if line.strip()]  # first 5 lines
+        sprite = np.zeros((30 * len(lines) + 10, width, 3), np.uint8)
+        mask = np.zeros(sprite.shape[:2], bool)
+        y_offset = 30
+        
+        for line in lines:
+            # Background rectangle for better text visibility
+            text_size = cv2.getTextSize(line, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)[0]
+            mask[y_offset - 25:y_offset + 6, 5:text_size[0] + 11] = True
+            cv2.putText(sprite, line, (10, y_offset), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            y_offset += 30
+        
+        mask |= sprite.any(axis=2)  # glyph pixels that overhang their rectangle
+        return sprite, mask
+    
+    def draw_overlay(self, display_frame):
+        """Blit the description overlay, re-rendering it only when the text changed"""
+        text = self.latest_description
+        if self._overlay_cache[0] != text:
+            self._overlay_cache = (text, *self.render_overlay(text, display_frame.shape[1]))
+        
+        _, sprite, mask = self._overlay_cache
+        np.copyto(display_frame[:sprite.shape[0]], sprite, where=mask[..., None])
+    
+    def publish_preview(self, display_frame):
+        """Hand a preview frame to the GUI thread, replacing one it has not shown yet"""
+        try:
+            self._display_q.put_nowait(display_frame)
+        except queue.Full:
+            try:
+                self._display_q.get_nowait()
+            except queue.Empty:
+                pass
+            self._display_q.put_nowait(display_frame)
+    
+    def show_latest_preview(self):
+        """Show the newest preview frame, if any, and pump GUI events; False once quit"""
+        try:
+            cv2.imshow('Gemini Live Video Analysis', self._display_q.get_nowait())
+        except queue.Empty:
+            pass
+        
+        # Handle key presses
+        key = cv2.waitKey(1) & 0xFF
+        return not (key == ord('q') or key == 27)  # 'q' or ESC
+    
+    def display_loop(self):
+        """Refresh the preview at ~30fps on the main thread until quit or capture stops"""
+        next_refresh = time.monotonic()
+        while self.running:
+            if not self.show_latest_preview():
+                self.running = False
+                break
+            next_refresh += DISPLAY_INTERVAL
+            time.sleep(max(0.0, next_refresh - time.monotonic()))
+    
     def capture_and_display(self):
-        """Main video capture and display loop"""
+        """Video capture loop; preview frames go to the GUI thread"""
         try:
             width, height, fps = self.initialize_camera()
             self.initialize_gemini()
+            self.start_analysis_loop()
             
             print("\nStarting video capture and Gemini analysis...")
             print("Press 'q' to quit")
             
             while self.running:
-                ret, frame = self.cap.read()
+                # Grab every frame to keep the camera buffer drained, but only decode
+                # the ones that get analyzed or shown
+                if not self.cap.grab():
+                    print("Error: Could not read frame from camera")
+                    break
+                
+                now = time.time()
+                if (now - self.last_frame_time < self.frame_interval and
+                        now - self.last_preview_time < self.preview_interval):
+                    continue
+                
+                # Decode into the same buffer every time; it is only read by the resize below
+                ret, frame = self.cap.retrieve(self._capture_buf)
                 if not ret:
                     print("Error: Could not read frame from camera")
                     break
+                self.last_preview_time = now
+                
+                # Downscale once; the analyzer gets a copy and the overlay is drawn in place
+                small = cv2.resize(frame, ANALYSIS_SIZE, interpolation=cv2.INTER_AREA)
                 
                 # Analyze frame if enough time has passed
                 current_time = time.time()
                 if current_time - self.last_frame_time >= self.frame_interval:
-                    # Run analysis in a separate thread to avoid blocking
-                    def analyze():
-                        description = self.analyze_frame(frame)
-                        self.latest_description = description
-                        print(f"Gemini: {description}")
-                    
-                    analysis_thread = threading.Thread(target=analyze)
-                    analysis_thread.start()
+                    # Requests overlap on the background loop instead of blocking capture
+                    if self.submit_frame(small.copy()):
+                        self.frame_count += 1
                     self.last_frame_time = current_time
-                    self.frame_count += 1
                 
                 # Display frame with description overlay
-                display_frame = frame.copy()
+                display_frame = small
                 
                 # Add description text overlay with background
-                description_lines = self.latest_description.split('\n')
-                y_offset = 30
-                
-                for line in description_lines[:5]:  # Show first 5 lines
-                    if line.strip():
-                        # Add background rectangle for better text visibility
-                        text_size = cv2.getTextSize(line.strip(), cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)[0]
-                        cv2.rectangle(display_frame, (5, y_offset - 25), (text_size[0] + 10, y_offset + 5), (0, 0, 0), -1)
-                        cv2.putText(display_frame, line.strip(), (10, y_offset), 
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                        y_offset += 30
+                self.draw_overlay(display_frame)
                 
                 # Add status info
                 status_text = f"Frames analyzed: {self.frame_count} | FPS: {fps}"
-                cv2.putText(display_frame, status_text, (10, height - 20), 
+                cv2.putText(display_frame, status_text, (10, display_frame.shape[0] - 20), 
                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
                 
-                cv2.imshow('Gemini Live Video Analysis', display_frame)
-                
-                # Handle key presses
-                key = cv2.waitKey(1) & 0xFF
-                if key == ord('q') or key == 27:  # 'q' or ESC
-                    break
+                # The GUI thread shows it; frames it has no time for are dropped
+                self.publish_preview(display_frame)
                     
         except Exception as e:
             print(f"Error in video capture: {e}")
         finally:
-            self.cleanup()
+            # Stops the display loop too; run() cleans up from the main thread
+            self.running = False
     
     def cleanup(self):
         """Cleanup resources"""
         self.running = False
+        self.stop_analysis_loop()
         if self.cap:
             self.cap.release()
         cv2.destroyAllWindows()
         print("Cleanup completed")
     
     def run(self):
-        """Main run method"""
+        """Main run method: capture on a worker thread, GUI on the main thread"""
         self.running = True
-        self.capture_and_display()
+        capture_thread = threading.Thread(target=self.capture_and_display, daemon=True)
+        capture_thread.start()
+        
+        try:
+            self.display_loop()
+        finally:
+            self.running = False
+            capture_thread.join()
+            self.cleanup()
 
 def main():
     parser = argparse.ArgumentParser(description='Gemini Live Video Analysis (Official Library)')
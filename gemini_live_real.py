@@ -5,16 +5,25 @@ Uses the actual Gemini Live API with WebSocket for real-time video processing.
 """
 
 import cv2
+import numpy as np
 import base64
-import json
+import orjson
 import asyncio
+import queue
 import websockets
-import threading
 import time
 from datetime import datetime
 import argparse
 import os
-from config import GEMINI_API_KEY, DEFAULT_CAMERA_INDEX, DEFAULT_FRAME_INTERVAL
+from frame_utils import create_jpeg_encoder, encode_bgr_to_jpeg_bytes, fourcc_name, request_mjpg
+from config import GEMINI_API_KEY, DEFAULT_CAMERA_INDEX, DEFAULT_FRAME_INTERVAL, LIVE_JPEG_QUALITY
+
+ANALYSIS_SIZE = (640, 360)  # frames are downscaled once to this for analysis and preview
+DISPLAY_INTERVAL = 1 / 30  # preview refresh period on the GUI (main) thread
+
+# realtimeInput envelope around the base64 JPEG; the base64 alphabet needs no JSON escaping
+FRAME_MESSAGE_HEAD = b'{"realtimeInput":{"image":{"mimeType":"image/jpeg","data":"'
+FRAME_MESSAGE_TAIL = b'"}}}'
 
 class GeminiLiveReal:
     def __init__(self, api_key, camera_index=0):
@@ -34,6 +43,15 @@ class GeminiLiveReal:
         self.frame_count = 0
         self.last_frame_time = 0
         self.frame_interval = 0.5  # Send frame every 500ms
+        self.last_preview_time = 0
+        self.preview_interval = 1 / 15  # Decode frames for the preview at ~15fps
+        self._tj = create_jpeg_encoder()  # reused for every frame
+        self._capture_buf = None  # full-size frame that every retrieve() decodes into
+        self._overlay_cache = (None, None, None)  # (text, sprite, mask) of the rendered description
+        self._display_q = queue.Queue(maxsize=1)  # newest preview frame for the GUI thread
+        self._loop = None  # event loop that owns the WebSocket
+        self._send_future = None  # previous frame send; new frames are skipped while it is pending
+        self.dropped_frames = 0
         
     def initialize_camera(self):
         """Initialize the camera capture"""
@@ -43,7 +61,8 @@ class GeminiLiveReal:
         if not self.cap.isOpened():
             raise Exception(f"Error: Could not open camera {self.camera_index}")
         
-        # Set camera properties
+        # Set camera properties; MJPG lets grab() skip frames without decoding them
+        request_mjpg(self.cap)
         self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
         self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
         self.cap.set(cv2.CAP_PROP_FPS, 30)
@@ -52,7 +71,8 @@ class GeminiLiveReal:
         height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         fps = int(self.cap.get(cv2.CAP_PROP_FPS))
         
-        print(f"Camera initialized: {width}x{height} @ {fps}fps")
+        print(f"Camera initialized: {width}x{height} @ {fps}fps ({fourcc_name(self.cap)})")
+        self._capture_buf = np.empty((height, width, 3), dtype=np.uint8)
         return width, height, fps
     
     async def connect_to_gemini_live(self):
@@ -62,7 +82,11 @@ class GeminiLiveReal:
         
         try:
             print("Connecting to Gemini Live API...")
-            self.websocket = await websockets.connect(uri)
+            # JPEG payloads don't compress, so skip permessage-deflate; bound the buffers
+            # so a slow side shows up as backpressure instead of memory growth
+            self.websocket = await websockets.connect(
+                uri, compression=None, max_size=2**24, max_queue=4, write_limit=2**20
+            )
             
             # Send setup message for Gemini Live API
             setup_message = {
@@ -80,7 +104,7 @@ class GeminiLiveReal:
                 }
             }
             
-            await self.websocket.send(json.dumps(setup_message))
+            await self.websocket.send(orjson.dumps(setup_message).decode())
             print("Connected to Gemini Live API successfully!")
             return True
             
@@ -88,30 +112,19 @@ class GeminiLiveReal:
             print(f"Error connecting to Gemini Live API: {e}")
             return False
     
-    async def send_video_frame(self, frame):
-        """Send a video frame to Gemini Live API"""
+    async def send_video_frame(self, frame_resized):
+        """Send a downscaled video frame to Gemini Live API"""
         if not self.websocket:
             return
         
         try:
-            # Resize frame for better performance
-            frame_resized = cv2.resize(frame, (640, 360))
+            # Encode frame as JPEG; 4:2:0 chroma is plenty for the model and keeps payloads small
+            jpeg_bytes = encode_bgr_to_jpeg_bytes(frame_resized, LIVE_JPEG_QUALITY, self._tj)
             
-            # Encode frame as JPEG
-            _, buffer = cv2.imencode('.jpg', frame_resized, [cv2.IMWRITE_JPEG_QUALITY, 80])
-            frame_base64 = base64.b64encode(buffer).decode('utf-8')
-            
-            # Create message for Gemini Live API
-            message = {
-                "realtimeInput": {
-                    "image": {
-                        "mimeType": "image/jpeg",
-                        "data": frame_base64
-                    }
-                }
-            }
+            # Splice the base64 bytes straight into the message: no str decode, no JSON pass
+            message = b"".join((FRAME_MESSAGE_HEAD, base64.b64encode(jpeg_bytes), FRAME_MESSAGE_TAIL))
             
-            await self.websocket.send(json.dumps(message))
+            await self.websocket.send(message)
             self.frame_count += 1
             
         except Exception as e:
@@ -122,7 +135,7 @@ class GeminiLiveReal:
         try:
             while self.running and self.websocket:
                 response = await self.websocket.recv()
-                response_data = json.loads(response)
+                response_data = orjson.loads(response)
                 
                 # Extract text description
                 if "serverContent" in response_data:
@@ -135,8 +148,65 @@ class GeminiLiveReal:
         except Exception as e:
             print(f"Error receiving response: {e}")
     
+    def render_overlay(self, text, width):
+        """Pre-render the description lines on their black backgrounds into a sprite and mask"""
+        lines = [line.strip() for line in text.split('\n')[:5] if line.strip()]  # first 5 lines
+        sprite = np.zeros((30 * len(lines) + 10, width, 3), np.uint8)
+        mask = np.zeros(sprite.shape[:2], bool)
+        y_offset = 30
+        
+        for line in lines:
+            # Background rectangle for better text visibility
+            text_size = cv2.getTextSize(line, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)[0]
+            mask[y_offset - 25:y_offset + 6, 5:text_size[0] + 11] = True
+            cv2.putText(sprite, line, (10, y_offset), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            y_offset += 30
+        
+        mask |= sprite.any(axis=2)  # glyph pixels that overhang their rectangle
+        return sprite, mask
+    
+    def draw_overlay(self, display_frame):
+        """Blit the description overlay, re-rendering it only when the text changed"""
+        text = self.latest_description
+        if self._overlay_cache[0] != text:
+            self._overlay_cache = (text, *self.render_overlay(text, display_frame.shape[1]))
+        
+        _, sprite, mask = self._overlay_cache
+        np.copyto(display_frame[:sprite.shape[0]], sprite, where=mask[..., None])
+    
+    def publish_preview(self, display_frame):
+        """Hand a preview frame to the GUI thread, replacing one it has not shown yet"""
+        try:
+            self._display_q.put_nowait(display_frame)
+        except queue.Full:
+            try:
+                self._display_q.get_nowait()
+            except queue.Empty:
+                pass
+            self._display_q.put_nowait(display_frame)
+    
+    def show_latest_preview(self):
+        """Show the newest preview frame, if any, and pump GUI events; False once quit"""
+        try:
+            cv2.imshow('Gemini Live Video Analysis', self._display_q.get_nowait())
+        except queue.Empty:
+            pass
+        
+        # Handle key presses
+        key = cv2.waitKey(1) & 0xFF
+        return not (key == ord('q') or key == 27)  # 'q' or ESC
+    
+    async def display_loop(self):
+        """Refresh the preview at ~30fps from the event loop, which owns the main thread"""
+        while self.running:
+            if not self.show_latest_preview():
+                self.running = False
+                break
+            await asyncio.sleep(DISPLAY_INTERVAL)
+    
     def capture_and_display(self):
-        """Main video capture and display loop"""
+        """Video capture loop; preview frames go to the GUI thread"""
         try:
             width, height, fps = self.initialize_camera()
             
@@ -144,50 +214,53 @@ class GeminiLiveReal:
             print("Press 'q' to quit")
             
             while self.running:
-                ret, frame = self.cap.read()
+                # Grab every frame to keep the camera buffer drained, but only decode
+                # the ones that get analyzed or shown
+                if not self.cap.grab():
+                    print("Error: Could not read frame from camera")
+                    break
+                
+                now = time.time()
+                if (now - self.last_frame_time < self.frame_interval and
+                        now - self.last_preview_time < self.preview_interval):
+                    continue
+                
+                # Decode into the same buffer every time; it is only read by the resize below
+                ret, frame = self.cap.retrieve(self._capture_buf)
                 if not ret:
                     print("Error: Could not read frame from camera")
                     break
+                self.last_preview_time = now
+                
+                # Downscale once; the analyzer gets a copy and the overlay is drawn in place
+                small = cv2.resize(frame, ANALYSIS_SIZE, interpolation=cv2.INTER_AREA)
                 
                 # Send frame to Gemini Live if enough time has passed
                 current_time = time.time()
                 if current_time - self.last_frame_time >= self.frame_interval:
-                    # Create a new event loop for this thread
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    try:
-                        loop.run_until_complete(self.send_video_frame(frame))
-                    finally:
-                        loop.close()
+                    if self._send_future is not None and not self._send_future.done():
+                        # The WebSocket is still busy with the last frame; skip rather than pile up sends
+                        self.dropped_frames += 1
+                    else:
+                        # Hand the send to the WebSocket's event loop without waiting on it
+                        self._send_future = asyncio.run_coroutine_threadsafe(
+                            self.send_video_frame(small.copy()), self._loop
+                        )
                     self.last_frame_time = current_time
                 
                 # Display frame with description overlay
-                display_frame = frame.copy()
+                display_frame = small
                 
                 # Add description text overlay with background
-                description_lines = self.latest_description.split('\n')
-                y_offset = 30
-                
-                for line in description_lines[:5]:  # Show first 5 lines
-                    if line.strip():
-                        # Add background rectangle for better text visibility
-                        text_size = cv2.getTextSize(line.strip(), cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)[0]
-                        cv2.rectangle(display_frame, (5, y_offset - 25), (text_size[0] + 10, y_offset + 5), (0, 0, 0), -1)
-                        cv2.putText(display_frame, line.strip(), (10, y_offset), 
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                        y_offset += 30
+                self.draw_overlay(display_frame)
                 
                 # Add status info
                 status_text = f"Frames sent: {self.frame_count} | FPS: {fps}"
-                cv2.putText(display_frame, status_text, (10, height - 20), 
+                cv2.putText(display_frame, status_text, (10, display_frame.shape[0] - 20), 
                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
                 
-                cv2.imshow('Gemini Live Video Analysis', display_frame)
-                
-                # Handle key presses
-                key = cv2.waitKey(1) & 0xFF
-                if key == ord('q') or key == 27:  # 'q' or ESC
-                    break
+                # The GUI thread shows it; frames it has no time for are dropped
+                self.publish_preview(display_frame)
                     
         except Exception as e:
             print(f"Error in video capture: {e}")
@@ -199,19 +272,17 @@ class GeminiLiveReal:
         self.running = False
         if self.cap:
             self.cap.release()
-        if self.websocket:
-            # Create a new event loop for cleanup
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                loop.run_until_complete(self.websocket.close())
-            finally:
-                loop.close()
-        cv2.destroyAllWindows()
+        if self.websocket and self._loop and not self._loop.is_closed():
+            # The WebSocket belongs to the main event loop; close it there
+            asyncio.run_coroutine_threadsafe(self.websocket.close(), self._loop)
+        if self.dropped_frames:
+            print(f"Skipped {self.dropped_frames} frames while the WebSocket was busy")
         print("Cleanup completed")
     
     async def run(self):
         """Main async run method"""
+        self._loop = asyncio.get_running_loop()
+        
         # Connect to Gemini Live
         if not await self.connect_to_gemini_live():
             return
@@ -219,20 +290,21 @@ class GeminiLiveReal:
         # Start response listener in background
         self.running = True
         response_task = asyncio.create_task(self.listen_for_responses())
-        
-        # Start video capture in separate thread
-        video_thread = threading.Thread(target=self.capture_and_display)
-        video_thread.start()
+        display_task = asyncio.create_task(self.display_loop())
         
         try:
-            # Wait for video thread to complete
-            video_thread.join()
+            # Capture blocks, so it runs on a worker thread while this loop keeps
+            # sending frames and receiving responses
+            await asyncio.to_thread(self.capture_and_display)
         except KeyboardInterrupt:
             print("\nInterrupted by user")
         finally:
             self.running = False
             response_task.cancel()
-            self.cleanup()
+            await display_task
+            cv2.destroyAllWindows()
+            if self.websocket:
+                await self.websocket.close()
 
 def main():
     parser = argparse.ArgumentParser(description='Gemini Live API Video Analysis')
@@ -0,0 +1,102 @@
+"""
+Gemini model selection shared by the video scripts
+Picks a model from one list_models() call instead of probing candidates with requests.
+"""
+
+import os
+import google.generativeai as genai
+
+MODEL_CACHE_PATH = os.path.expanduser("~/.cache/gemini_live/model.txt")
+
+# Process-wide state shared by every camera/instance
+_configured_key = None  # API key genai is currently configured with
+_model_cache = {}  # (api_key, model_name) -> GenerativeModel
+_picked_models = {}  # (api_key, candidates) -> model name picked by this process
+
+def configure(api_key):
+    """Configure genai for this key, skipping the call when it already is"""
+    global _configured_key
+    if api_key != _configured_key:
+        genai.configure(api_key=api_key)
+        _configured_key = api_key
+
+def get_model(api_key, model_name):
+    """GenerativeModel shared by all instances using the same key and model"""
+    configure(api_key)
+    model = _model_cache.get((api_key, model_name))
+    if model is None:
+        model = _model_cache[(api_key, model_name)] = genai.GenerativeModel(model_name)
+    return model
+
+def read_cached_model():
+    """Model name chosen on a previous run, or None"""
+    try:
+        with open(MODEL_CACHE_PATH) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def cache_model(model_name):
+    """Remember the chosen model for the next run"""
+    try:
+        os.makedirs(os.path.dirname(MODEL_CACHE_PATH), exist_ok=True)
+        with open(MODEL_CACHE_PATH, "w") as f:
+            f.write(model_name)
+    except OSError as e:
+        print(f"Could not cache model name: {e}")
+
+def forget_cached_model():
+    """Drop the cached model, e.g. after it stopped working"""
+    _picked_models.clear()
+    try:
+        os.remove(MODEL_CACHE_PATH)
+    except OSError:
+        pass
+
+def list_generate_models():
+    """Names (without the models/ prefix) of models that support generateContent"""
+    return {
+        model.name.removeprefix("models/")
+        for model in genai.list_models()
+        if "generateContent" in model.supported_generation_methods
+    }
+
+def pick_model(candidates):
+    """
+    Choose a model with a single list_models() call, once per process; configure() must run first
+
+    Args:
+        candidates (list): Model names in order of preference
+    """
+    candidates = [name.removeprefix("models/") for name in candidates]
+    picked = _picked_models.get((_configured_key, tuple(candidates)))
+    if picked is not None:
+        return picked
+    
+    model_name = _pick_model(candidates)
+    _picked_models[(_configured_key, tuple(candidates))] = model_name
+    return model_name
+
+def _pick_model(candidates):
+    """Cached choice if still listed, else the first listed candidate"""
+    cached = read_cached_model()
+    if cached not in candidates:
+        cached = None  # chosen by a script with a different candidate list
+
+    try:
+        available = list_generate_models()
+    except Exception as e:
+        # Listing failed (offline, quota...); trust the last choice or the first candidate
+        print(f"Could not list Gemini models: {e}")
+        return cached or candidates[0]
+
+    if cached in available:
+        return cached
+
+    for model_name in candidates:
+        if model_name in available:
+            cache_model(model_name)
+            return model_name
+
+    forget_cached_model()
+    raise Exception(f"None of the candidate models are available: {candidates}")
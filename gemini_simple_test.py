@@ -11,6 +11,7 @@ import base64
 import cv2
 import time
 from config import GEMINI_API_KEY
+from frame_utils import create_jpeg_encoder, encode_bgr_to_jpeg_bytes
 
 async def test_gemini_connection():
     """Test basic connection to Gemini Live API"""
@@ -29,8 +30,8 @@ async def test_gemini_connection():
                        cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
         
         # Encode image
-        _, buffer = cv2.imencode('.jpg', test_image)
-        image_base64 = base64.b64encode(buffer).decode('utf-8')
+        jpeg_bytes = encode_bgr_to_jpeg_bytes(test_image, tj=create_jpeg_encoder())
+        image_base64 = base64.b64encode(jpeg_bytes).decode('ascii')
         
         # Connect to Gemini Live API
         uri = "wss://generativelanguage.googleapis.com/ws/v1beta/models/gemini-2.0-flash-exp:streamGenerateContent"
@@ -41,6 +41,7 @@ DEFAULT_WIDTH=1280
 DEFAULT_HEIGHT=720
 DEFAULT_FPS=30
 JPEG_QUALITY=85
+LIVE_JPEG_QUALITY=70
 """
     
     # Write .env file
@@ -24,6 +24,8 @@ def test_camera():
         start_time = time.time()
         while time.time() - start_time < 5:
             frame = video_capture.capture_frame()
+            if frame is None:
+                continue
             video_capture.record_frame(frame)
             
             # Show frame
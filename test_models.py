@@ -3,23 +3,24 @@
 Test script to check available Gemini models
 """
 
-import google.generativeai as genai
 from config import GEMINI_API_KEY
+from gemini_models import configure, get_model, list_generate_models, cache_model
 
 def test_models():
     """Test available Gemini models"""
     print("Testing Gemini API models...")
     
-    genai.configure(api_key=GEMINI_API_KEY)
+    configure(GEMINI_API_KEY)
     
-    # List available models
+    # List available models once; candidates are checked against this set
     try:
-        models = genai.list_models()
+        available = list_generate_models()
         print("Available models:")
-        for model in models:
-            print(f"  - {model.name}")
+        for name in sorted(available):
+            print(f"  - {name}")
     except Exception as e:
         print(f"Error listing models: {e}")
+        return None
     
     # Test different model configurations
     model_configs = [
@@ -36,12 +37,18 @@ def test_models():
     ]
     
     for config in model_configs:
+        if config['name'] not in available:
+            print(f"❌ {config['name']} ({config['version']}) is not available")
+            continue
+        
+        # Only the first available candidate costs a request
         try:
             print(f"\nTrying {config['name']} with {config['version']}...")
-            model = genai.GenerativeModel(config['name'])
+            model = get_model(GEMINI_API_KEY, config['name'])
             response = model.generate_content("Hello")
             if response.text:
                 print(f"✅ {config['name']} works!")
+                cache_model(config['name'])
                 return config['name']
             else:
                 print(f"❌ {config['name']} responded but no text")
@@ -7,8 +7,11 @@ Captures video from the default camera and records it to a file.
 import cv2
 import numpy as np
 import os
-from datetime import datetime
 import argparse
+import time
+
+MAX_MISSED_FRAMES = 30  # consecutive failed reads before the camera is considered gone
+MISSED_FRAMES_ERROR = "Error: Could not read frame from camera ({} misses in a row)"
 
 class VideoCapture:
     def __init__(self, camera_index=0, output_dir="recordings"):
@@ -22,12 +25,28 @@ class VideoCapture:
         self.camera_index = camera_index
         self.output_dir = output_dir
         self.cap = None
+        self._cached_props = None  # (width, height, fps) negotiated when the camera was opened
         self.writer = None
         self.recording = False
         
+        # Status labels are rasterized once and blitted onto each preview frame
+        self._overlay_rec = self.render_status("RECORDING")
+        self._overlay_prev = self.render_status("PREVIEW")
+        
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
         
+    @staticmethod
+    def render_status(text):
+        """Pre-render a status label into a small BGR tile"""
+        tile = np.zeros((40, 260, 3), np.uint8)
+        cv2.putText(tile, text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+        return tile
+    
+    def draw_status(self, frame):
+        """Blit the RECORDING/PREVIEW label onto the top-left corner of a frame"""
+        frame[0:40, 0:260] = self._overlay_rec if self.recording else self._overlay_prev
+    
     def initialize_camera(self):
         """Initialize the camera capture"""
         print(f"Initializing camera {self.camera_index}...")
@@ -59,13 +78,15 @@ class VideoCapture:
             return
         
         if filename is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = time.strftime("%Y%m%d_%H%M%S")
             filename = f"video_capture_{timestamp}.mp4"
         
         filepath = os.path.join(self.output_dir, filename)
         
-        # Get camera properties
-        width, height, fps = self.initialize_camera()
+        # The camera stays open for the whole session; only the writer is per recording
+        if self.cap is None:
+            self._cached_props = self.initialize_camera()
+        width, height, fps = self._cached_props
         
         # Define codec and create VideoWriter
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
@@ -81,15 +102,12 @@ class VideoCapture:
         return filepath
     
     def capture_frame(self):
-        """Capture a single frame from camera"""
+        """Capture a single frame from camera; None if the read failed"""
         if self.cap is None:
             raise Exception("Camera not initialized!")
         
         ret, frame = self.cap.read()
-        if not ret:
-            raise Exception("Error: Could not read frame from camera")
-        
-        return frame
+        return frame if ret else None
     
     def record_frame(self, frame):
         """Record a frame to the video file"""
@@ -113,6 +131,7 @@ class VideoCapture:
         if self.cap:
             self.cap.release()
             self.cap = None
+            self._cached_props = None
         cv2.destroyAllWindows()
         print("Cleanup completed")
 
@@ -138,16 +157,23 @@ def main():
         print("  'r' - Start new recording")
         print("  'ESC' - Quit application")
         
+        missed_frames = 0
         while True:
             # Capture frame
             frame = video_capture.capture_frame()
+            if frame is None:
+                # Skip camera glitches; only a long run of failed reads is fatal
+                missed_frames += 1
+                if missed_frames > MAX_MISSED_FRAMES:
+                    raise Exception(MISSED_FRAMES_ERROR.format(missed_frames))
+                continue
+            missed_frames = 0
             
             # Record frame if recording
             video_capture.record_frame(frame)
             
             # Display frame with recording status
-            status_text = "RECORDING" if video_capture.recording else "PREVIEW"
-            cv2.putText(frame, status_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+            video_capture.draw_status(frame)
             
             # Show frame
             cv2.imshow('Video Capture - Press q to quit', frame)
@@ -7,29 +7,367 @@ Captures video from the default camera and records it to a file with proper code
 import cv2
 import numpy as np
 import os
-from datetime import datetime
+import queue
+import shutil
+import signal
+import subprocess
+import sys
+import threading
 import argparse
 import time
+from concurrent.futures import ThreadPoolExecutor
+from frame_utils import fourcc_name
+try:
+    import av
+except ImportError:
+    av = None
+try:
+    from pynput import keyboard
+except ImportError:
+    keyboard = None
+
+MAX_MISSED_FRAMES = 30  # consecutive failed reads before the camera is considered gone
+MISSED_FRAMES_ERROR = "Error: Could not read frame from camera ({} misses in a row)"
+SEGMENT_SECONDS = 300  # long recordings roll over to a new file this often
+RECORD_BATCH = 8  # most queued frames RecordWorker writes per lock acquisition
+QUEUE_TIMEOUT = 0.1  # seconds a stage blocks on a full/empty queue before re-checking shutdown
+
+# Keys (as returned by cv2.waitKey) and the actions they post to action_q
+KEY_ACTIONS = {
+    ord('q'): "quit",
+    27: "quit",  # ESC
+    ord('s'): "stop",
+    ord('r'): "record",
+}
+
+# Low-latency options per H.264 encoder: no B-frames so frames never wait on later ones, and a
+# keyframe every second (g, added from the fps); seeking may be slightly coarser, fine for live capture
+ENCODER_OPTIONS = {
+    "h264_videotoolbox": {"realtime": "1", "allow_sw": "0", "bf": "0", "b": "6M"},  # Apple media engine only
+    "libx264": {"preset": "ultrafast", "tune": "zerolatency", "bf": "0", "crf": "23"},
+}
+
+# H.264 encoders tried through PyAV, fastest first
+PYAV_ENCODERS = ["h264_videotoolbox", "libx264"]
+
+OPENCV_THREADS = 4  # cap on OpenCV's internal worker threads; capture/record/preview have their own
+
+# Codec for the ffmpeg subprocess encoder
+FFMPEG_CODEC = "h264_videotoolbox" if sys.platform == "darwin" else "libx264"
+FFMPEG_PIPE_BUFFER = 10 * 1024 * 1024  # bytes buffered on our side of ffmpeg's stdin
+
+class PyAVWriter:
+    """cv2.VideoWriter-like H.264 writer on PyAV, so a hardware encoder can be used"""
+    
+    def __init__(self, path, codec, fps, size, input_format='bgr24'):
+        self.input_format = input_format  # 'bgr24', or 'nv12' straight from the camera
+        self.container = av.open(path, mode='w')
+        try:
+            self.stream = self.container.add_stream(codec, rate=fps)
+            self.stream.width, self.stream.height = size
+            self.stream.pix_fmt = 'yuv420p'
+            self.stream.options = {**ENCODER_OPTIONS.get(codec, {}), "g": str(int(fps))}
+            # Open now so an unusable encoder fails here rather than on the first frame
+            self.stream.codec_context.open()
+        except Exception:
+            self.container.close()
+            raise
+        self.frame_index = 0
+    
+    def isOpened(self):
+        return self.container is not None
+    
+    def write(self, frame):
+        """Encode one BGR (or NV12) frame and mux the packets it produces"""
+        frame_av = av.VideoFrame.from_ndarray(frame, format=self.input_format)
+        frame_av.pts = self.frame_index
+        if self.frame_index == 0:
+            # Start on a keyframe so players have a reference from the very first frame
+            frame_av.pict_type = av.video.frame.PictureType.I
+        self.frame_index += 1
+        for packet in self.stream.encode(frame_av):
+            self.container.mux(packet)
+    
+    def release(self):
+        """Flush the encoder and finalize the file"""
+        if self.container is None:
+            return
+        for packet in self.stream.encode(None):
+            self.container.mux(packet)
+        self.container.close()
+        self.container = None
+
+class FFmpegPipeWriter:
+    """cv2.VideoWriter-like writer piping raw frames into an ffmpeg process, which exits on release"""
+    
+    def __init__(self, path, fps, size, input_format='bgr24'):
+        if shutil.which("ffmpeg") is None:
+            raise Exception("ffmpeg not found on PATH")
+        self.input_format = input_format
+        width, height = size
+        options = [arg for name, value in ENCODER_OPTIONS[FFMPEG_CODEC].items() for arg in (f'-{name}', value)]
+        self.proc = subprocess.Popen(
+            ['ffmpeg', '-y', '-loglevel', 'error',
+             '-f', 'rawvideo', '-vcodec', 'rawvideo', '-s', f'{width}x{height}',
+             '-pix_fmt', input_format, '-r', str(fps), '-i', '-',
+             '-c:v', FFMPEG_CODEC, '-g', str(int(fps)), *options, '-pix_fmt', 'yuv420p', path],
+            stdin=subprocess.PIPE, bufsize=FFMPEG_PIPE_BUFFER)
+    
+    def isOpened(self):
+        return self.proc is not None and self.proc.poll() is None
+    
+    def write(self, frame):
+        """Pipe one raw frame to ffmpeg without copying it"""
+        try:
+            self.proc.stdin.write(memoryview(frame).cast('B'))
+        except BrokenPipeError:
+            raise Exception(f"ffmpeg exited with code {self.proc.poll()}")
+    
+    def release(self):
+        """Close ffmpeg's input and wait for it to finalize the file"""
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.proc.wait()
+        self.proc = None
+
+def open_video_writer(path, fps, size, input_format='bgr24', encoder='auto'):
+    """Open an H.264 writer: PyAV (VideoToolbox, then libx264), then OpenCV avc1, then MP4V"""
+    if encoder == 'ffmpeg':
+        writer = FFmpegPipeWriter(path, fps or 30, size, input_format)
+        print(f"Encoding with ffmpeg ({FFMPEG_CODEC})")
+        return writer
+    
+    if av is not None:
+        for codec in PYAV_ENCODERS:
+            try:
+                writer = PyAVWriter(path, codec, fps or 30, size, input_format)
+                print(f"Encoding with {codec}")
+                return writer
+            except Exception as e:
+                print(f"{codec} encoder unavailable: {e}")
+    
+    # Use H.264 codec which is more compatible
+    fourcc = cv2.VideoWriter_fourcc(*'avc1')  # H.264 codec
+    writer = cv2.VideoWriter(path, fourcc, fps, size)
+    
+    if not writer.isOpened():
+        # Fallback to MP4V if H.264 doesn't work
+        print("H.264 codec failed, trying MP4V...")
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        writer = cv2.VideoWriter(path, fourcc, fps, size)
+    
+    return writer
+
+class CaptureWorker(threading.Thread):
+    """Reads frames from the camera into the record queue"""
+    
+    def __init__(self, video_capture):
+        super().__init__(daemon=True)
+        self.video_capture = video_capture
+    
+    def run(self):
+        try:
+            self.capture()
+        finally:
+            # Lets RecordWorker know nothing more will be queued
+            self.video_capture.capture_done.set()
+    
+    def capture(self):
+        vc = self.video_capture
+        while not vc.shutdown_event.is_set():
+            index = None
+            try:
+                # Grab at camera rate so frames never pile up in the driver queue
+                if not vc.grab_frame():
+                    vc.note_miss()
+                    continue
+                
+                if vc.current_drop_policy() == "all":
+                    index = vc.acquire_buffer()
+                elif not vc.record_q.full():
+                    index = vc.acquire_buffer(wait=False)
+                if index is None:
+                    continue  # "latest": pipeline busy, skip decoding this grab
+                
+                # retrieve() decodes into the pooled buffer in place, so no frame is allocated or copied
+                frame = vc.retrieve_frame(vc.pool[index])
+                if frame is None:
+                    vc.release_buffer(index)
+                    index = None
+                    vc.note_miss()
+                    continue
+                vc.pool[index] = frame
+                vc.missed_frames = 0
+            except Exception as e:
+                print(f"Error: {e}")
+                if index is not None:
+                    vc.release_buffer(index)
+                vc.shutdown_event.set()
+                break
+            vc.put_frame(vc.record_q, index)
+
+class RecordWorker(threading.Thread):
+    """Writes frames to the active recording, then hands them on to the preview; drains the queue on shutdown"""
+    
+    def __init__(self, video_capture):
+        super().__init__(daemon=True)
+        self.video_capture = video_capture
+    
+    def run(self):
+        vc = self.video_capture
+        while True:
+            # Checked before the get: once capture is done, an empty queue means every frame was written
+            capture_done = vc.capture_done.is_set()
+            try:
+                batch = [vc.record_q.get(timeout=QUEUE_TIMEOUT)]
+            except queue.Empty:
+                if capture_done:
+                    break
+                continue
+            
+            # Take whatever else is already queued, so a backlog is written in one pass
+            while len(batch) < RECORD_BATCH:
+                try:
+                    batch.append(vc.record_q.get_nowait())
+                except queue.Empty:
+                    break
+            
+            try:
+                vc.record_frames([vc.pool[index] for index in batch])
+            except Exception as e:
+                print(f"Error: {e}")
+                for index in batch:
+                    vc.release_buffer(index)
+                vc.shutdown_event.set()
+                break
+            
+            for index in batch:
+                if vc.preview:
+                    vc.offer_preview(index)
+                else:
+                    vc.release_buffer(index)
+
+class KeyboardListener(threading.Thread):
+    """Posts key presses to the action queue from a pynput hook, for when there is no window to focus"""
+    
+    def __init__(self, action_q):
+        super().__init__(daemon=True)
+        self.action_q = action_q
+        self.listener = None
+    
+    def on_press(self, key):
+        if key == keyboard.Key.esc:
+            code = 27
+        elif getattr(key, 'char', None):
+            code = ord(key.char)
+        else:
+            return
+        if code in KEY_ACTIONS:
+            self.action_q.put(KEY_ACTIONS[code])
+    
+    def run(self):
+        with keyboard.Listener(on_press=self.on_press) as self.listener:
+            self.listener.join()
+    
+    def stop(self):
+        if self.listener:
+            self.listener.stop()
 
 class VideoCaptureFixed:
-    def __init__(self, camera_index=0, output_dir="recordings"):
+    def __init__(self, camera_index=0, output_dir="recordings", drop_policy=None, nv12=False, preview=True,
+                 encoder='auto', umat=False):
         """
         Initialize video capture
         
         Args:
             camera_index (int): Camera index (0 for default camera)
             output_dir (str): Directory to save recorded videos
+            drop_policy (str): "all" decodes every grabbed frame, "latest" skips grabs while
+                the pipeline is busy; None uses "all" while recording and "latest" otherwise
+            nv12 (bool): Capture unconverted NV12 and hand it straight to the encoder
+            preview (bool): Show recorded frames in a HighGUI window
+            encoder (str): 'auto' for PyAV/OpenCV, 'ffmpeg' to pipe frames to an ffmpeg process
+            umat (bool): Convert and annotate preview frames as OpenCL UMats
         """
         self.camera_index = camera_index
         self.output_dir = output_dir
+        
+        # Make sure the SIMD-dispatched kernels (cvtColor, resize, putText) are in use
+        cv2.setUseOptimized(True)
+        cv2.setNumThreads(min(OPENCV_THREADS, os.cpu_count() or 1))
+        if not cv2.useOptimized():
+            print("⚠️  OpenCV was built without optimized code paths; conversions will be slow")
+        self.drop_policy = drop_policy
+        self.nv12 = nv12
+        self.preview = preview
+        self.encoder = encoder
+        self.umat = umat
         self.cap = None
+        self._cached_props = None  # (width, height, fps) negotiated when the camera was opened
+        self.missed_frames = 0  # consecutive failed reads; glitches are skipped, not raised
+        self.display_every = 1  # show every Nth recorded frame, keeping the preview near 30 Hz
         self.writer = None
+        self._warmup_frames = 0  # copies of the first frame still to write to a fresh OpenCV writer
         self.recording = False
-        self.output_file = None
+        
+        # Status labels are rasterized once and blitted onto each preview frame
+        self._overlay_rec = self.render_status("RECORDING")
+        self._overlay_prev = self.render_status("PREVIEW")
+        self._umat_overlays = {}  # recording flag -> (overlay, mask) UMats for the OpenCL preview
+        self.output_file = None  # file currently being written; a new one per segment
+        self._segments = []  # every file of the current recording, in order
+        self._segment_base = None
+        self._segment_frame_count = 0
+        self.segment_frames = 0
+        
+        # Capture -> record -> preview pipeline; the record queue absorbs encoder stalls and
+        # applies back-pressure, the preview queue drops stale frames instead of stalling recording.
+        # Queues carry indices into self.pool, and an index goes back on free_q once displayed.
+        self.record_q = queue.Queue(maxsize=8)
+        self.preview_q = queue.Queue(maxsize=2)
+        self.pool = []
+        self.free_q = queue.Queue()
+        self.shutdown_event = threading.Event()
+        self.capture_done = threading.Event()  # set once CaptureWorker has queued its last frame
+        self._writer_lock = threading.Lock()  # writer is swapped by the main thread, used by RecordWorker
+        self._workers = []
+        self.action_q = queue.Queue()  # "quit"/"stop"/"record" from the window or the keyboard thread
+        self._keyboard = None
+        self._verify_pool = ThreadPoolExecutor(max_workers=1)  # checks finished files off the UI thread
         
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
         
+    @staticmethod
+    def render_status(text):
+        """Pre-render a status label into a small BGR tile"""
+        tile = np.zeros((40, 260, 3), np.uint8)
+        cv2.putText(tile, text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+        return tile
+    
+    def draw_status(self, frame):
+        """Blit the RECORDING/PREVIEW label onto the top-left corner of a frame"""
+        if isinstance(frame, cv2.UMat):
+            overlay, mask = self.status_umats()
+            cv2.copyTo(overlay, mask, frame)
+            return
+        frame[0:40, 0:260] = self._overlay_rec if self.recording else self._overlay_prev
+    
+    def status_umats(self):
+        """Full-frame (overlay, mask) UMats of the current label, uploaded once per status"""
+        if self.recording not in self._umat_overlays:
+            width, height, _ = self._cached_props
+            overlay = np.zeros((height, width, 3), np.uint8)
+            self.draw_status(overlay)
+            mask = np.zeros((height, width), np.uint8)
+            mask[0:40, 0:260] = 1
+            self._umat_overlays[self.recording] = (cv2.UMat(overlay), cv2.UMat(mask))
+        return self._umat_overlays[self.recording]
+    
     def initialize_camera(self):
         """Initialize the camera capture"""
         print(f"Initializing camera {self.camera_index}...")
@@ -43,6 +381,15 @@ class VideoCaptureFixed:
         self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
         self.cap.set(cv2.CAP_PROP_FPS, 30)
         
+        if self.nv12:
+            # Skip the per-frame YUV -> BGR conversion; only displayed frames get converted
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'NV12'))
+            self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+            if fourcc_name(self.cap) != 'NV12' or self.cap.get(cv2.CAP_PROP_CONVERT_RGB):
+                print(f"Camera refused raw NV12 (delivering {fourcc_name(self.cap)}), capturing BGR")
+                self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+                self.nv12 = False
+        
         # Get actual camera properties
         width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
@@ -61,77 +408,268 @@ class VideoCaptureFixed:
             return
         
         if filename is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = time.strftime("%Y%m%d_%H%M%S")
             filename = f"video_capture_{timestamp}.mp4"
         
         self.output_file = os.path.join(self.output_dir, filename)
+        self._segment_base = os.path.splitext(self.output_file)[0]
+        self._segments = [self.output_file]
+        self._segment_frame_count = 0
         
-        # Get camera properties
-        width, height, fps = self.initialize_camera()
-        
-        # Use H.264 codec which is more compatible
-        fourcc = cv2.VideoWriter_fourcc(*'avc1')  # H.264 codec
-        self.writer = cv2.VideoWriter(self.output_file, fourcc, fps, (width, height))
+        # The camera stays open for the whole session; only the writer is per recording
+        if self.cap is None:
+            self._cached_props = self.initialize_camera()
+        width, height, fps = self._cached_props
+        self.display_every = max(1, fps // 30)
+        self.segment_frames = (fps or 30) * SEGMENT_SECONDS
         
-        if not self.writer.isOpened():
-            # Fallback to MP4V if H.264 doesn't work
-            print("H.264 codec failed, trying MP4V...")
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            self.writer = cv2.VideoWriter(self.output_file, fourcc, fps, (width, height))
-            
+        self.writer = self.open_writer(self.output_file)
         if not self.writer.isOpened():
             raise Exception(f"Error: Could not create video file {self.output_file}")
         
+        # OpenCV writers give no keyframe control (ffmpeg starts on one anyway), so hold the first frame
+        # for half a second instead; players would otherwise drop the head of the clip while their
+        # decoder warms up
+        self._warmup_frames = 0 if isinstance(self.writer, (PyAVWriter, FFmpegPipeWriter)) else int(fps * 0.5)
+        
         self.recording = True
         print(f"Started recording to: {self.output_file}")
         print("Press 'q' to quit, 's' to stop recording")
         
         return self.output_file
     
-    def capture_frame(self):
-        """Capture a single frame from camera"""
+    def open_writer(self, path):
+        """Hardware H.264 when available, falling back down to OpenCV's MP4V"""
+        width, height, fps = self._cached_props
+        return open_video_writer(path, fps, (width, height), 'nv12' if self.nv12 else 'bgr24', self.encoder)
+    
+    def _rotate_writer(self):
+        """Finish the current segment and continue in a new file; caller holds _writer_lock"""
+        # Long-lived writers slow down and grow in memory, so each segment gets a fresh one
+        self.writer.release()
+        self._verify_pool.submit(self._verify_file, self.output_file)
+        
+        self.output_file = f"{self._segment_base}_part{len(self._segments):03d}.mp4"
+        self._segments.append(self.output_file)
+        self._segment_frame_count = 0
+        self.writer = self.open_writer(self.output_file)
+        if not self.writer.isOpened():
+            print(f"Error: Could not create video file {self.output_file}")
+            self.recording = False
+            return
+        print(f"Continuing recording in: {self.output_file}")
+    
+    def write_concat_list(self):
+        """Write an ffconcat list of the segments, for `ffmpeg -f concat -i list -c copy`"""
+        list_file = f"{self._segment_base}.ffconcat"
+        with open(list_file, "w") as f:
+            f.write("ffconcat version 1.0\n")
+            for segment in self._segments:
+                f.write(f"file '{os.path.basename(segment)}'\n")
+        print(f"Segment list saved: {list_file}")
+    
+    def capture_frame(self, dst=None):
+        """Capture a single frame from camera, into dst when given; None if the read failed"""
         if self.cap is None:
             raise Exception("Camera not initialized!")
         
-        ret, frame = self.cap.read()
+        ret, frame = self.cap.read(dst)
+        return frame if ret else None
+    
+    def grab_frame(self):
+        """Grab the next frame from the camera without decoding it; False if the grab failed"""
+        if self.cap is None:
+            raise Exception("Camera not initialized!")
+        
+        return self.cap.grab()
+    
+    def retrieve_frame(self, dst=None):
+        """Decode the last grabbed frame, into dst when given; None if decoding failed"""
+        ret, frame = self.cap.retrieve(dst)
         if not ret:
-            raise Exception("Error: Could not read frame from camera")
+            return None
+        
+        if self.nv12:
+            # Raw buffers may come back flat; view them as the Y plane over the interleaved UV plane
+            width, height, _ = self._cached_props
+            frame = frame.reshape(height * 3 // 2, width)
         
         return frame
     
+    def to_bgr(self, frame):
+        """BGR view of a captured frame, converting from NV12 when capturing raw"""
+        if self.nv12:
+            return cv2.cvtColor(frame, cv2.COLOR_YUV2BGR_NV12)
+        return frame
+    
+    def note_miss(self):
+        """Count a failed read, giving up once the camera has failed too many times in a row"""
+        self.missed_frames += 1
+        if self.missed_frames > MAX_MISSED_FRAMES:
+            raise Exception(MISSED_FRAMES_ERROR.format(self.missed_frames))
+    
+    def current_drop_policy(self):
+        """Drop policy in effect: every frame while recording, the latest one for preview only"""
+        if self.drop_policy:
+            return self.drop_policy
+        return "all" if self.recording else "latest"
+    
     def record_frame(self, frame):
         """Record a frame to the video file"""
-        if self.writer and self.recording:
-            self.writer.write(frame)
+        self.record_frames((frame,))
+    
+    def record_frames(self, frames):
+        """Record a batch of frames, taking the writer lock once"""
+        with self._writer_lock:
+            for frame in frames:
+                if not (self.writer and self.recording):
+                    break
+                if getattr(self.writer, 'input_format', 'bgr24') == 'bgr24':
+                    frame = self.to_bgr(frame)  # OpenCV writers only take BGR
+                while self._warmup_frames > 0:
+                    self.writer.write(frame)
+                    self._warmup_frames -= 1
+                self.writer.write(frame)
+                
+                self._segment_frame_count += 1
+                if self._segment_frame_count >= self.segment_frames:
+                    self._rotate_writer()
+    
+    def allocate_pool(self):
+        """Preallocate the frame buffers shared by the pipeline threads"""
+        width, height, _ = self._cached_props
+        
+        # One buffer per queue slot, plus one being captured, a batch being recorded and one displayed
+        size = self.record_q.maxsize + self.preview_q.maxsize + RECORD_BATCH + 2
+        shape = (height * 3 // 2, width) if self.nv12 else (height, width, 3)
+        self.pool = [np.empty(shape, np.uint8) for _ in range(size)]
+        self.free_q = queue.Queue()
+        for index in range(size):
+            self.free_q.put(index)
+    
+    def acquire_buffer(self, wait=True):
+        """Index of a free pool buffer, waiting for one to be released; None on shutdown"""
+        if not wait:
+            try:
+                return self.free_q.get_nowait()
+            except queue.Empty:
+                return None
+        
+        while not self.shutdown_event.is_set():
+            try:
+                return self.free_q.get(timeout=QUEUE_TIMEOUT)
+            except queue.Empty:
+                continue
+        return None
+    
+    def release_buffer(self, index):
+        """Return a pool buffer once every consumer is done with it"""
+        self.free_q.put(index)
+    
+    def put_frame(self, q, index):
+        """Put a frame index on a pipeline queue, waiting while it is full; False on shutdown"""
+        while not self.shutdown_event.is_set():
+            try:
+                q.put(index, timeout=QUEUE_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        self.release_buffer(index)
+        return False
+    
+    def offer_preview(self, index):
+        """Queue a frame for display, discarding the oldest one if the preview is behind"""
+        try:
+            self.preview_q.put_nowait(index)
+        except queue.Full:
+            try:
+                self.release_buffer(self.preview_q.get_nowait())
+            except queue.Empty:
+                pass
+            self.preview_q.put_nowait(index)
+    
+    def next_preview_frame(self):
+        """Pool index of the next recorded frame to display, or None if none arrived in time"""
+        try:
+            return self.preview_q.get(timeout=QUEUE_TIMEOUT)
+        except queue.Empty:
+            return None
+    
+    def start_workers(self):
+        """Start the capture and record threads"""
+        self.shutdown_event.clear()
+        self.capture_done.clear()
+        self.allocate_pool()
+        self._workers = [CaptureWorker(self), RecordWorker(self)]
+        for worker in self._workers:
+            worker.start()
+    
+    def stop_workers(self):
+        """Signal the pipeline threads to stop and wait for them; captured frames are still recorded"""
+        self.shutdown_event.set()
+        for worker in self._workers:  # capture first, then the record thread drains what it queued
+            worker.join()
+        self._workers = []
+    
+    def start_keyboard(self):
+        """Listen for keys globally, since without a preview window HighGUI never sees them; False without pynput"""
+        if keyboard is None:
+            print("pynput not installed; stop with Ctrl+C")
+            return False
+        self._keyboard = KeyboardListener(self.action_q)
+        self._keyboard.start()
+        return True
+    
+    def dispatch(self, action):
+        """Carry out a key action"""
+        if action == "quit":
+            self.shutdown_event.set()
+        elif action == "stop":  # Stop recording
+            self.stop_recording()
+        elif action == "record":  # Start new recording
+            if not self.recording:
+                self.start_recording()
+    
+    def _verify_file(self, path):
+        """Open a finished recording and report its frame count"""
+        test_cap = cv2.VideoCapture(path)
+        if test_cap.isOpened():
+            frame_count = int(test_cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            test_cap.release()
+            print(f"Video file is valid with {frame_count} frames")
+            return True
+        else:
+            print("Warning: Video file may be corrupted")
+            return False
     
     def stop_recording(self):
-        """Stop recording and cleanup"""
+        """Stop recording; returns a Future of the file check, or False if nothing was saved"""
         if self.recording:
-            self.recording = False
-            if self.writer:
-                self.writer.release()
-                self.writer = None
-                print("Recording stopped and saved!")
+            with self._writer_lock:
+                self.recording = False
+                writer, self.writer = self.writer, None
+            if writer:
+                # Hold the file open across release() so its final size can be read without a second lookup
+                try:
+                    fd = os.open(self.output_file, os.O_RDONLY)
+                except OSError:
+                    fd = None
                 
-                # Give time for file to be properly written
-                time.sleep(0.5)
+                # release() blocks until the encoder has flushed and the container is finalized
+                writer.release()
+                print("Recording stopped and saved!")
+                if len(self._segments) > 1:
+                    self.write_concat_list()
                 
                 # Verify file was created and is valid
-                if os.path.exists(self.output_file):
-                    file_size = os.path.getsize(self.output_file)
+                if fd is not None:
+                    file_size = os.fstat(fd).st_size
+                    os.close(fd)
                     print(f"Video file saved: {self.output_file}")
                     print(f"File size: {file_size} bytes")
                     
-                    # Test if file can be opened
-                    test_cap = cv2.VideoCapture(self.output_file)
-                    if test_cap.isOpened():
-                        frame_count = int(test_cap.get(cv2.CAP_PROP_FRAME_COUNT))
-                        test_cap.release()
-                        print(f"Video file is valid with {frame_count} frames")
-                        return True
-                    else:
-                        print("Warning: Video file may be corrupted")
-                        return False
+                    # Parsing the container takes a while on long files; do it in the background
+                    return self._verify_pool.submit(self._verify_file, self.output_file)
                 else:
                     print("Error: Video file was not created")
                     return False
@@ -141,11 +679,18 @@ class VideoCaptureFixed:
     
     def cleanup(self):
         """Cleanup resources"""
+        if self._keyboard:
+            self._keyboard.stop()
+            self._keyboard = None
+        self.stop_workers()
         self.stop_recording()
+        self._verify_pool.shutdown(wait=True)
         if self.cap:
             self.cap.release()
             self.cap = None
-        cv2.destroyAllWindows()
+            self._cached_props = None
+        if self.preview:
+            cv2.destroyAllWindows()
         print("Cleanup completed")
 
 def main():
@@ -153,11 +698,21 @@ def main():
     parser.add_argument('--camera', type=int, default=0, help='Camera index (default: 0)')
     parser.add_argument('--output', type=str, default='recordings', help='Output directory (default: recordings)')
     parser.add_argument('--filename', type=str, help='Output filename (optional)')
+    parser.add_argument('--drop-policy', choices=['all', 'latest'],
+                        help='Decode every frame or only the latest (default: all while recording, latest otherwise)')
+    parser.add_argument('--nv12', action='store_true', help='Record raw NV12 from the camera without BGR conversion')
+    parser.add_argument('--encoder', choices=['auto', 'ffmpeg'], default='auto',
+                        help='auto: PyAV, then OpenCV; ffmpeg: pipe raw frames to an ffmpeg process (default: auto)')
+    parser.add_argument('--umat', action='store_true', help='Process the preview as OpenCL UMats')
+    parser.add_argument('--no-preview', action='store_true', help='Record without a preview window (keys via pynput)')
     
     args = parser.parse_args()
     
     # Create video capture instance
-    video_capture = VideoCaptureFixed(camera_index=args.camera, output_dir=args.output)
+    video_capture = VideoCaptureFixed(camera_index=args.camera, output_dir=args.output,
+                                      drop_policy=args.drop_policy, nv12=args.nv12,
+                                      preview=not args.no_preview, encoder=args.encoder,
+                                      umat=args.umat)
     
     try:
         # Start recording
@@ -170,29 +725,49 @@ def main():
         print("  'r' - Start new recording")
         print("  'ESC' - Quit application")
         
-        while True:
-            # Capture frame
-            frame = video_capture.capture_frame()
-            
-            # Record frame if recording
-            video_capture.record_frame(frame)
-            
-            # Display frame with recording status
-            status_text = "RECORDING" if video_capture.recording else "PREVIEW"
-            cv2.putText(frame, status_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-            
-            # Show frame
-            cv2.imshow('Video Capture (Fixed) - Press q to quit', frame)
+        # Capture and recording run on their own threads; this one only previews and handles keys
+        video_capture.start_workers()
+        if not video_capture.preview:
+            # Headless: HighGUI is never touched; Ctrl+C or a pynput key press ends the session
+            signal.signal(signal.SIGINT, lambda *_: video_capture.shutdown_event.set())
+            if not video_capture.start_keyboard():
+                video_capture.shutdown_event.wait()
+        
+        frame_idx = 0
+        while not video_capture.shutdown_event.is_set():
+            if video_capture.preview:
+                # Frames arrive here after they were recorded, so the overlay never ends up in the file
+                index = video_capture.next_preview_frame()
+                shown = False
+                if index is not None:
+                    # Every frame is recorded; only every Nth one pays for imshow
+                    if frame_idx % video_capture.display_every == 0:
+                        frame = video_capture.pool[index]
+                        if video_capture.umat:
+                            # Upload once; NV12 conversion, the label and imshow then stay on the GPU
+                            frame = cv2.UMat(frame)
+                        frame = video_capture.to_bgr(frame)
+                        
+                        # Display frame with recording status
+                        video_capture.draw_status(frame)
+                        
+                        # Show frame; imshow copies it, so the buffer can go straight back to the pool
+                        cv2.imshow('Video Capture (Fixed) - Press q to quit', frame)
+                        shown = True
+                    video_capture.release_buffer(index)
+                    frame_idx += 1
+                
+                # Window keys; skipped frames only poll instead of waiting a millisecond
+                key = (cv2.waitKey(1) if shown or index is None else cv2.pollKey()) & 0xFF
+                if key in KEY_ACTIONS:
+                    video_capture.action_q.put(KEY_ACTIONS[key])
             
-            # Handle key presses
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q') or key == 27:  # 'q' or ESC
-                break
-            elif key == ord('s'):  # Stop recording
-                video_capture.stop_recording()
-            elif key == ord('r'):  # Start new recording
-                if not video_capture.recording:
-                    video_capture.start_recording()
+            # Keys from the window and the keyboard thread both arrive as actions
+            try:
+                action = video_capture.action_q.get(block=not video_capture.preview, timeout=QUEUE_TIMEOUT)
+            except queue.Empty:
+                continue
+            video_capture.dispatch(action)
     
     except KeyboardInterrupt:
         print("\nInterrupted by user")